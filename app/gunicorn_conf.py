@@ -0,0 +1,20 @@
+# Multi-worker deployment that loads the embedding model and role indexes once,
+# in the master, before workers are forked:
+#
+#   cd app && gunicorn -c gunicorn_conf.py main:app
+#
+# (`uvicorn --workers N` spawns fresh interpreters, so nothing is shared there.)
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = 120
+
+# Import main.py in the master so workers share model / index pages copy-on-write
+preload_app = True
+
+# Workers must agree on build jobs, so default to the shared state backend
+os.environ.setdefault("STATE_BACKEND", "sqlite")
+# Without this main.py leaves the model to each worker's startup warmup, i.e. one copy per worker
+os.environ.setdefault("PRELOAD_INDEXES", "1")
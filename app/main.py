@@ -1,26 +1,65 @@
-from fastapi import FastAPI, HTTPException, Depends, Form
+from fastapi import FastAPI, HTTPException, Depends, File, Form, UploadFile
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
-from typing import Dict, Optional
+from typing import Optional
+from collections import OrderedDict
 from uuid import uuid4
 import os
+import re
 import json
+import httpx
 import shutil
+import time
+import asyncio
+import multiprocessing
+import queue
+import threading
 import warnings
+import numpy as np
 from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 
-from langchain_community.document_loaders import DirectoryLoader, TextLoader, CSVLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain_groq import ChatGroq
-from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
-from collections import defaultdict, deque
-# Store last 5 chat turns per user/role (can be extended to use username too)
-chat_memory = defaultdict(lambda: deque(maxlen=5))
+from langchain_core.documents import Document
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import partial
+
+from services.embedding_backends import create_embeddings, embedding_model_id
+from services.embedding_cache import CachedEmbeddings, EmbeddingCache, LazyEmbeddings
+from services.ann import EXACT_INDEX_FILE, index_spec, search_params
+from services.chunking import MarkdownChunker
+from services.answer_cache import SemanticAnswerCache
+from services.build_jobs import BuildJobManager
+from services.conversation_memory import ConversationMemory, conversation_key
+from services.state_backend import create_state_backend
+from services.indexing import (
+    SUPPORTED_EXTENSIONS,
+    RoleIndex,
+    build_role_in_worker,
+    chunk_file,
+    current_version,
+    current_version_path,
+    file_hash,
+    index_signature,
+    init_build_worker,
+    is_table_only,
+    load_manifest,
+    load_role_index,
+    new_version_name,
+    prune_versions,
+    publish_version,
+    role_needs_sync,
+    sync_role_index,
+)
+from services.live_index import LiveIndex
+from services.tombstones import Tombstones
+from services.query_embedder import QueryEmbedder
+from services.retrieval import LIVE_SUFFIX, fetch_documents, is_identifier_query, merge_results, search_collection
+from services.tables import TableStore, format_result, is_analytical_query, mentions_tables, run_table_query
+from services.user_store import UserExistsError, UserStore
+from services.vector_cache import RoleIndexCache, directory_size
+from services.watcher import DataDirWatcher, Debouncer
 # Initialize
 load_dotenv()
 warnings.filterwarnings("ignore")
@@ -36,10 +75,20 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login", auto_error=False)
 
 app = FastAPI(title="RAG Chatbot Auth API")
 
-DB_FILE = "users.json"
+DB_FILE = os.getenv("USER_DB_FILE", "users.db")
+LEGACY_USERS_JSON = "users.json"
+# "memory" keeps shared state (build jobs) per process; "sqlite" shares it between uvicorn/gunicorn workers
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory")
+STATE_DB_FILE = os.getenv("STATE_DB_FILE", "state.db")
+# Chat history is kept per user + session, persisted, and trimmed to a token budget;
+# turns that fall out of the budget are folded into a running summary
+CHAT_DB_FILE = os.getenv("CHAT_DB_FILE", "chat_memory.db")
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1000"))
+SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "250"))
 
 app.add_middleware(
     CORSMiddleware,
@@ -49,17 +98,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-def load_users():
-    if os.path.exists(DB_FILE):
-        with open(DB_FILE, "r") as f:
-            return json.load(f)
-    return {}
-
-def save_users():
-    with open(DB_FILE, "w") as f:
-        json.dump(users_db, f, indent=4)
-
-users_db: Dict[str, Dict] = load_users()
+user_store = UserStore(DB_FILE, legacy_json_path=LEGACY_USERS_JSON)
+state = create_state_backend(STATE_BACKEND, STATE_DB_FILE)
+memory = ConversationMemory(CHAT_DB_FILE, token_budget=HISTORY_TOKEN_BUDGET)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -68,9 +109,9 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 def authenticate_user(username: str, password: str):
-    for user_id, user_data in users_db.items():
-        if user_data["username"] == username and user_data["password"] == password:
-            return {"id": user_id, "username": username, "role": user_data["role"]}
+    user_data = user_store.get_by_username(username)
+    if user_data and user_data["password"] == password:
+        return {"id": user_data["id"], "username": username, "role": user_data["role"]}
     return None
 
 def get_current_user(token: str = Depends(oauth2_scheme)):
@@ -85,13 +126,24 @@ def get_current_user(token: str = Depends(oauth2_scheme)):
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid or expired token.")
 
+def get_optional_user(token: Optional[str] = Depends(optional_oauth2_scheme)):
+    # Anonymous requests are allowed, but a token that is sent must be valid
+    return get_current_user(token) if token else None
+
+def chat_conversation(role, user, session_id):
+    """Conversation key of a chat: the token's user, else an anonymous per-session conversation."""
+    if user is not None:
+        return conversation_key(role, user["username"], session_id)
+    if not session_id:
+        raise HTTPException(status_code=400, detail="❌ Send a bearer token or a session_id to chat.")
+    return conversation_key(role, None, session_id)
+
 @app.post("/register")
 def register(username: str = Form(...), password: str = Form(...), role: str = Form(...)):
-    if any(u["username"] == username for u in users_db.values()):
+    try:
+        user_store.create(username, password, role)
+    except UserExistsError:
         raise HTTPException(status_code=400, detail="Username already exists.")
-    user_id = str(uuid4())
-    users_db[user_id] = {"username": username, "password": password, "role": role}
-    save_users()
     return {"message": f"User '{username}' registered successfully as '{role}'."}
 
 
@@ -102,8 +154,7 @@ def login(form_data: OAuth2PasswordRequestForm = Depends()):
         raise HTTPException(status_code=401, detail="Incorrect username or password.")
 
     # Mark user as logged in
-    users_db[user["id"]]["logged_in"] = True
-    save_users()
+    user_store.set_logged_in(user["username"], True)
 
     token = create_access_token({
         "sub": user["username"],
@@ -114,20 +165,17 @@ def login(form_data: OAuth2PasswordRequestForm = Depends()):
 
 @app.post("/logout")
 def logout(username: str = Form(...)):
-    for user_id, user_data in users_db.items():
-        if user_data["username"] == username:
-            user_data["logged_in"] = False
-            save_users()
-            return {"message": "Logged out successfully"}
+    if user_store.set_logged_in(username, False):
+        return {"message": "Logged out successfully"}
     raise HTTPException(status_code=404, detail="User not found.")
 @app.get("/get_user_status")
 def get_user_status(username: str):
-    for user_data in users_db.values():
-        if user_data["username"] == username:
-            return {
-                "logged_in": user_data.get("logged_in", False),
-                "role": user_data["role"]
-            }
+    user_data = user_store.get_by_username(username)
+    if user_data:
+        return {
+            "logged_in": user_data["logged_in"],
+            "role": user_data["role"]
+        }
     raise HTTPException(status_code=404, detail="User not found.")
 
 
@@ -138,127 +186,680 @@ def protected(user=Depends(get_current_user)):
 ATA_DIR = "./resources/data"
 VECTOR_DIR = "./faiss_vectors"
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+# Byte budget for FAISS stores kept resident between /rag_chat calls
+VECTOR_CACHE_MAX_BYTES = int(os.getenv("VECTOR_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "./embedding_cache")
+# Load the embedding model and every published role store at import (set by gunicorn_conf.py so
+# forked workers share them); otherwise each process loads them in its startup warmup
+PRELOAD_INDEXES = os.getenv("PRELOAD_INDEXES", "0") == "1"
+# Reindex collections automatically when files under resources/data change. Once a burst of changes
+# has been quiet for WATCH_DEBOUNCE_SEC, just the changed files are re-embedded into the live segment;
+# their collections are folded into a new published version after WATCH_FOLD_DELAY_SEC without changes.
+WATCH_DATA_DIR = os.getenv("WATCH_DATA_DIR", "0") == "1"
+WATCH_DEBOUNCE_SEC = float(os.getenv("WATCH_DEBOUNCE_SEC", "2"))
+WATCH_MAX_DELAY_SEC = float(os.getenv("WATCH_MAX_DELAY_SEC", "30"))
+WATCH_FOLD_DELAY_SEC = float(os.getenv("WATCH_FOLD_DELAY_SEC", "300"))
+WATCH_FOLD_MAX_DELAY_SEC = float(os.getenv("WATCH_FOLD_MAX_DELAY_SEC", "3600"))
+# Uploaded documents (md, csv, txt, pdf) are saved into their collection folder and searchable from
+# an in-memory live segment as soon as they are embedded; a background build then folds them in.
+# The live segment is per worker: other workers find an upload once the fold publishes it
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(20 * 1024 * 1024)))
+UPLOAD_HISTORY = int(os.getenv("UPLOAD_HISTORY", "100"))
+# Deleted documents are tombstoned (filtered out of every search at once); a collection is compacted
+# by an incremental rebuild once this share of its stored chunks is tombstoned
+COMPACTION_TOMBSTONE_RATIO = float(os.getenv("COMPACTION_TOMBSTONE_RATIO", "0.2"))
 
-embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+# "torch" (sentence-transformers), "onnx" or "onnx-int8" (ONNX Runtime; exported to ONNX_MODEL_DIR on
+# first start). ONNX backends cache and index vectors under their own id, so switching rebuilds.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0")) or None
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "./onnx_models")
+EMBEDDING_MODEL_ID = embedding_model_id(EMBEDDING_BACKEND, EMBEDDING_MODEL_NAME)
+# Chunk sizes are in embedding-model tokens (all-MiniLM-L6-v2 reads at most 256). Markdown is
+# split at headings and small sections are merged; overlap only applies inside long sections.
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "250"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "25"))
+CHUNK_MIN_SIZE = int(os.getenv("CHUNK_MIN_SIZE", "64"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+# FAISS index per collection: "flat" (exact), "hnsw" or "ivfpq". VECTOR_INDEX_TYPES overrides
+# the default per collection, e.g. {"hr": "hnsw"}. Build-time settings are trained into the
+# index by /build_vectors; IVF_NPROBE and HNSW_EF_SEARCH are applied on every query.
+VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "flat")
+VECTOR_INDEX_TYPES = json.loads(os.getenv("VECTOR_INDEX_TYPES", "{}"))
+HNSW_M = int(os.getenv("HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "80"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+IVF_NLIST = int(os.getenv("IVF_NLIST", "1024"))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "16"))
+PQ_M = int(os.getenv("PQ_M", "16"))
+PQ_NBITS = int(os.getenv("PQ_NBITS", "8"))
+# Roles indexed concurrently (one process each) and file-loading threads per role
+BUILD_WORKERS = int(os.getenv("BUILD_WORKERS", str(os.cpu_count() or 1)))
+LOAD_WORKERS = int(os.getenv("LOAD_WORKERS", "4"))
+# Chats allowed in flight per worker, and threads for CPU-bound query embedding / FAISS search
+RAG_MAX_CONCURRENCY = int(os.getenv("RAG_MAX_CONCURRENCY", "64"))
+RAG_CPU_WORKERS = int(os.getenv("RAG_CPU_WORKERS", str(os.cpu_count() or 4)))
+# Collections (folders under resources/data, each indexed once) every role may search. Roles
+# not listed read the collection of the same name; "*" grants every collection.
+ROLE_COLLECTIONS = json.loads(os.getenv("ROLE_COLLECTIONS", '{"c-suite": "*", "employee": ["general"]}'))
+# Collections each role may upload documents to and delete them from; roles not listed may not change any
+ROLE_WRITE_COLLECTIONS = json.loads(os.getenv(
+    "ROLE_WRITE_COLLECTIONS",
+    '{"c-suite": "*", "finance": ["finance"], "hr": ["hr"], "marketing": ["marketing"], "engineering": ["engineering"]}',
+))
+# Hybrid retrieval: dense + BM25 candidates (fetch_k each) fused by reciprocal rank into k chunks
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "6"))
+RETRIEVAL_FETCH_K = int(os.getenv("RETRIEVAL_FETCH_K", "20"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+# CSVs are also loaded as typed columns; aggregate/filter/sort questions run there and only
+# the result (at most TABLE_RESULT_MAX_ROWS rows) reaches the LLM. Tables larger than
+# TABLE_EMBED_MAX_ROWS are not embedded row by row at all.
+TABLE_RESULT_MAX_ROWS = int(os.getenv("TABLE_RESULT_MAX_ROWS", "50"))
+TABLE_EMBED_MAX_ROWS = int(os.getenv("TABLE_EMBED_MAX_ROWS", "10000"))
+# Concurrent queries arriving within the wait window share one embedding forward pass
+QUERY_EMBED_MAX_BATCH = int(os.getenv("QUERY_EMBED_MAX_BATCH", "32"))
+QUERY_EMBED_MAX_WAIT_MS = float(os.getenv("QUERY_EMBED_MAX_WAIT_MS", "5"))
+QUERY_EMBED_CACHE_SIZE = int(os.getenv("QUERY_EMBED_CACHE_SIZE", "2048"))
+# Near-duplicate questions (cosine >= threshold) are answered from cache without an LLM call
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL_SEC = float(os.getenv("ANSWER_CACHE_TTL_SEC", "3600"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "256"))
 
-@app.post("/build_vectors")
-def build_vectors():
+LLM_MODEL_NAME = os.getenv("LLM_MODEL_NAME", "llama3-8b-8192")
+LLM_TIMEOUT_SEC = float(os.getenv("LLM_TIMEOUT_SEC", "60"))
+LLM_CONNECT_TIMEOUT_SEC = float(os.getenv("LLM_CONNECT_TIMEOUT_SEC", "5"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "20"))
+LLM_KEEPALIVE_EXPIRY_SEC = float(os.getenv("LLM_KEEPALIVE_EXPIRY_SEC", "120"))
+LLM_WARMUP = os.getenv("LLM_WARMUP", "1") == "1"
+# Embedded and searched against every collection at startup so /readyz means the first chat is fast
+WARMUP_QUERY = os.getenv("WARMUP_QUERY", "What is the leave policy?")
+
+embeddings_factory = partial(
+    create_embeddings, EMBEDDING_BACKEND, EMBEDDING_MODEL_NAME,
+    onnx_dir=ONNX_MODEL_DIR,
+    threads=EMBEDDING_THREADS,
+)
+# Loaded by the startup warmup (or the first request needing it), or at import with PRELOAD_INDEXES
+embedding_model = LazyEmbeddings(embeddings_factory)
+# Ingestion goes through the on-disk cache so unchanged text is never re-embedded
+ingest_embeddings = CachedEmbeddings(embedding_model, EmbeddingCache(EMBEDDING_CACHE_DIR, EMBEDDING_MODEL_ID))
+splitter = MarkdownChunker(EMBEDDING_MODEL_NAME, CHUNK_SIZE, CHUNK_OVERLAP, CHUNK_MIN_SIZE)
+INDEX_SIGNATURE = index_signature(EMBEDDING_MODEL_ID, CHUNK_SIZE, CHUNK_OVERLAP, TABLE_EMBED_MAX_ROWS, CHUNK_MIN_SIZE)
+table_store = TableStore(DATA_DIR)
+vector_cache = RoleIndexCache(max_bytes=VECTOR_CACHE_MAX_BYTES)
+live_index = LiveIndex()
+tombstones = Tombstones(VECTOR_DIR)
+query_embedder = QueryEmbedder(
+    embedding_model,
+    max_batch_size=QUERY_EMBED_MAX_BATCH,
+    max_wait_ms=QUERY_EMBED_MAX_WAIT_MS,
+    cache_size=QUERY_EMBED_CACHE_SIZE,
+)
+answer_cache = SemanticAnswerCache(
+    threshold=ANSWER_CACHE_THRESHOLD,
+    ttl_sec=ANSWER_CACHE_TTL_SEC,
+    max_entries=ANSWER_CACHE_MAX_ENTRIES,
+)
+cpu_executor = ThreadPoolExecutor(max_workers=RAG_CPU_WORKERS, thread_name_prefix="rag-cpu")
+chat_slots = asyncio.Semaphore(RAG_MAX_CONCURRENCY)
+
+
+async def run_cpu(func, *args):
+    """Run blocking embedding / search work on the bounded CPU pool, off the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(cpu_executor, partial(func, *args))
+
+
+def collection_index_spec(collection):
+    return index_spec(
+        VECTOR_INDEX_TYPES.get(collection, VECTOR_INDEX_TYPE),
+        hnsw_m=HNSW_M,
+        hnsw_ef_construction=HNSW_EF_CONSTRUCTION,
+        ivf_nlist=IVF_NLIST,
+        pq_m=PQ_M,
+        pq_nbits=PQ_NBITS,
+    )
+
+def load_role_store(role_vector_path, deleted=frozenset()):
+    print(f"📥 Loading vector store from: {role_vector_path}")
+    index, chunks, _, _ = load_role_index(role_vector_path)
+    excluded = chunks.positions_of(deleted) if deleted else None
+    params = search_params(index, nprobe=IVF_NPROBE, ef_search=HNSW_EF_SEARCH, excluded_positions=excluded)
+    # The exact vectors kept for incremental builds are never loaded for serving
+    nbytes = directory_size(role_vector_path) - directory_size(os.path.join(role_vector_path, EXACT_INDEX_FILE))
+    return RoleIndex(index, chunks, params, deleted), nbytes
+
+def cached_store(collection, version):
+    """``(RoleIndex, cache key)`` of a published version, filtering the collection's tombstones.
+
+    A new tombstone changes the key, so the store is reopened (cheap: it is
+    memory-mapped) with the deleted positions excluded.
+    """
+    deleted, stamp = tombstones.get(collection)
+    key = f"{version}+{stamp}" if stamp else version
+    path = os.path.join(VECTOR_DIR, collection, version)
+    return vector_cache.get(collection, lambda: load_role_store(path, deleted), version=key), key
+
+def run_build(job):
     print("\n🚀 Starting vector building process...")
-    logs = {}
 
-    # 1. Reset vector storage
-    if os.path.exists(VECTOR_DIR):
-        print("🧹 Cleaning old vector directory...")
-        shutil.rmtree(VECTOR_DIR)
+    # 1. Make sure vector storage exists (published role stores keep serving meanwhile)
     os.makedirs(VECTOR_DIR, exist_ok=True)
     print(f"📁 Vector directory ready: {VECTOR_DIR}")
 
-    # 2. Iterate through each role
-    for role in os.listdir(DATA_DIR):
+    roles = [r for r in os.listdir(DATA_DIR) if os.path.isdir(os.path.join(DATA_DIR, r))]
+    stale = [r for r in os.listdir(VECTOR_DIR) if r not in roles]
+    if job.collections is not None:
+        # Builds started by the data watcher only look at the collections whose files changed
+        roles = [r for r in roles if r in job.collections]
+        stale = [r for r in stale if r in job.collections]
+
+    # 2. Drop stores whose source folder no longer exists
+    for role in stale:
+        print(f"🧹 Removing stale vector store: {role}")
+        unpublish_role(role)
+
+    # 3. Plan: only roles whose files changed need loading and embedding
+    tasks = {}
+    for role in roles:
         role_path = os.path.join(DATA_DIR, role)
-        print(f"<UNK> Role {role} ready: {role_path}")
-        if not os.path.isdir(role_path):
+        role_dir = os.path.join(VECTOR_DIR, role)
+        current = current_version(role_dir)
+        current_path = os.path.join(role_dir, current) if current else None
+        job.update_role(role, status="queued")
+        if not role_needs_sync(role_path, current_path, INDEX_SIGNATURE, collection_index_spec(role)):
+            reconcile_published(role)
+            job.details[role] = "✅ Up to date"
+            job.update_role(role, status="completed", finished_at=time.time())
             continue
+        version = new_version_name()
+        tasks[role] = (role_path, current, current_path, version, os.path.join(role_dir, version))
 
-        print(f"\n🔍 Processing role: {role} {role_path}")
-        all_docs = []
+    # 4. Sync stale roles into fresh version directories, several roles at once
+    workers = min(BUILD_WORKERS, len(tasks))
+    hits, misses = ingest_embeddings.hits, ingest_embeddings.misses
+    if workers <= 1:
+        for role, (role_path, _, current_path, _, output_path) in tasks.items():
+            print(f"\n🔍 Processing role: {role} {role_path}")
+            job.update_role(role, status="running")
+            try:
+                summary = sync_role_index(
+                    role, role_path, current_path, output_path, ingest_embeddings, splitter, INDEX_SIGNATURE,
+                    batch_size=EMBED_BATCH_SIZE,
+                    load_workers=LOAD_WORKERS,
+                    progress=lambda **fields: job.update_role(role, **fields),
+                    index_spec=collection_index_spec(role),
+                )
+            except Exception as e:
+                summary = e
+            finish_role(job, role, tasks[role], summary)
+        hits, misses = ingest_embeddings.hits - hits, ingest_embeddings.misses - misses
+    else:
+        hits, misses = run_build_in_processes(job, tasks, workers)
 
-        # --- Load .md Files ---
-        for fname in os.listdir(role_path):
-            if fname.endswith(".md"):
-                fpath = os.path.join(role_path, fname)
-                try:
-                    loader = TextLoader(fpath, encoding="utf-8")  # Specify encoding
-                    docs = loader.load()
-                    all_docs.extend(docs)
-                    print(f"📄 Loaded .md file: {fname} ({len(docs)} docs)")
-                except Exception as e:
-                    print(f"❌ Skipping {fname}: {e}")
+    print(f"🧠 Embedding cache: {hits} hits, {misses} misses")
+    print("\n✅ Vector building complete.\n")
+
+
+def run_build_in_processes(job, tasks, workers):
+    """Build ``tasks`` on a process pool; returns the workers' summed embedding cache ``(hits, misses)``."""
+    ctx = multiprocessing.get_context("spawn")
+    progress_queue = ctx.Queue()
+    hits = misses = 0
+    done = threading.Event()
+
+    def relay_progress():
+        while not done.is_set() or not progress_queue.empty():
+            try:
+                role, fields = progress_queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            job.update_role(role, **fields)
 
-        # --- Load .csv Files ---
-        for fname in os.listdir(role_path):
-            print(fname.endswith)
-            if fname.endswith(".csv"):
-                fpath = os.path.join(role_path, fname)
+    relay = threading.Thread(target=relay_progress, name="build-progress", daemon=True)
+    relay.start()
+    torch_threads = max(1, (os.cpu_count() or 1) // workers)
+    print(f"⚙️ Building {len(tasks)} roles on {workers} processes ({torch_threads} torch threads each)")
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=ctx,
+            initializer=init_build_worker,
+            initargs=(embeddings_factory, EMBEDDING_CACHE_DIR, EMBEDDING_MODEL_ID, torch_threads, progress_queue),
+        ) as pool:
+            futures = {}
+            for role, (role_path, _, current_path, _, output_path) in tasks.items():
+                futures[pool.submit(
+                    build_role_in_worker, role, role_path, current_path, output_path,
+                    splitter, INDEX_SIGNATURE, EMBED_BATCH_SIZE, LOAD_WORKERS, collection_index_spec(role),
+                )] = role
+            for future in as_completed(futures):
+                role = futures[future]
                 try:
-                    loader = CSVLoader(file_path=fpath)
-                    docs = loader.load()
-                    all_docs.extend(docs)
-                    print(f"🧾 Loaded .csv file: {fname} ({len(docs)} rows)")
+                    summary = future.result()
+                    hits += summary["cache_hits"]
+                    misses += summary["cache_misses"]
                 except Exception as e:
-                    print(f"❌ Skipping CSV {fname}: {e}")
+                    summary = e
+                finish_role(job, role, tasks[role], summary)
+    finally:
+        done.set()
+        relay.join()
+    return hits, misses
 
-        if not all_docs:
-            logs[role] = "⚠️ No valid documents found"
-            print(logs[role])
-            continue
 
-        # 3. Chunk and store
-        chunks = splitter.split_documents(all_docs)
-        print(f"✂️ Created {len(chunks)} chunks for role: {role}")
+def finish_role(job, role, task, summary):
+    """Publish (or discard) a role's freshly built version and record the outcome."""
+    _, current, _, version, output_path = task
+    role_dir = os.path.join(VECTOR_DIR, role)
 
-        if not chunks:
-            logs[role] = "⚠️ No chunks created"
-            continue
+    if isinstance(summary, Exception):
+        shutil.rmtree(output_path, ignore_errors=True)
+        job.details[role] = f"❌ Vector store update failed: {summary}"
+        job.update_role(role, status="failed", finished_at=time.time())
+        print(job.details[role])
+        return
 
-        try:
-            vectordb = FAISS.from_documents(chunks, embedding_model)
-            role_vec_path = os.path.join(VECTOR_DIR, role)
-            vectordb.save_local(role_vec_path)
-            logs[role] = f"✅ {len(chunks)} chunks stored at {role_vec_path}"
-            print(logs[role])
-        except Exception as e:
-            logs[role] = f"❌ Vector store creation failed: {e}"
-            print(logs[role])
+    if summary["chunks"] == 0:
+        unpublish_role(role)
+        job.details[role] = "⚠️ No valid documents found"
+    elif summary["changed"]:
+        publish_version(role_dir, version)
+        # Answers of every role that can read this collection are stale now
+        answer_cache.invalidate()
+        prune_versions(role_dir, keep={version, current})
+        job.details[role] = (f"✅ {summary['chunks']} chunks stored at {output_path} "
+                             f"(+{summary['added']} / -{summary['deleted']}, "
+                             f"{summary['docs_per_sec']} docs/s, {summary['chunks_per_sec']} chunks/s)")
+    else:
+        job.details[role] = f"✅ Up to date ({summary['chunks']} chunks)"
+    reconcile_published(role)
+    job.update_role(role, status="completed", finished_at=time.time(), docs_per_sec=summary["docs_per_sec"])
+    print(job.details[role])
 
-    print("\n✅ Vector building complete.\n")
-    return {"status": "completed", "details": logs}
 
-@app.post("/rag_chat")
-def rag_chat(query: str = Form(...), role: str = Form(...)):
-    print(f"\n🟦 Received RAG Chat Request")
-    print(f"📝 Query: {query}")
-    print(f"👤 Role: {role}")
+def unpublish_role(role):
+    role_dir = os.path.join(VECTOR_DIR, role)
+    if os.path.exists(role_dir):
+        shutil.rmtree(role_dir, ignore_errors=True)
+    vector_cache.invalidate(role)
+    live_index.clear(role)
+    answer_cache.invalidate()
 
-    role = role.lower().strip()
-    role_vector_path = os.path.join(VECTOR_DIR, role)
+def reconcile_published(role):
+    # Uploads the published version now contains are served from it instead of the live segment,
+    # and tombstones of chunks it no longer contains have been compacted away
+    current_path = current_version_path(os.path.join(VECTOR_DIR, role))
+    manifest = load_manifest(current_path) if current_path else None
+    if manifest is not None:
+        live_index.drop_published(role, manifest["files"])
+        tombstones.prune(role, (chunk["id"] for f in manifest["files"].values() for chunk in f["chunks"]))
+
+
+build_jobs = BuildJobManager(run_build, state=state, lock_path=VECTOR_DIR.rstrip("/") + ".lock")
+# Rebuilds collections whose files the data watcher has only put in the live segment so far
+data_folds = Debouncer(
+    build_jobs.submit, WATCH_FOLD_DELAY_SEC, WATCH_FOLD_MAX_DELAY_SEC, label="folding changed collections",
+)
+
+@app.post("/build_vectors", status_code=202)
+def build_vectors():
+    job = build_jobs.submit()
+    return {"status": job.status, "job_id": job.id}
+
+@app.get("/build_vectors/{job_id}")
+def build_vectors_status(job_id: str):
+    job = build_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Build job '{job_id}' not found.")
+    return job
+
+uploads = OrderedDict()  # upload_id -> status of a recent upload taken by this worker, oldest first
+
+def publish_upload(upload):
+    # Shared so every worker can answer GET /upload/{upload_id}, not just the one that took it
+    state.set("uploads", upload["upload_id"], dict(upload))
+
+def writable_collection(user, collection=None):
+    """The collection a user adds or deletes documents in: one ``ROLE_WRITE_COLLECTIONS`` lets their role change."""
+    allowed = expand_collections(ROLE_WRITE_COLLECTIONS.get(user["role"], []))
+    if not allowed:
+        raise HTTPException(status_code=403, detail=f"❌ Role '{user['role']}' can't change documents.")
+    collection = collection or (allowed[0] if len(allowed) == 1 else user["role"])
+    if not re.fullmatch(r"[A-Za-z0-9_-]+", collection) or collection not in allowed:
+        raise HTTPException(status_code=403, detail=f"❌ Role '{user['role']}' can't change documents in '{collection}'.")
+    return collection
+
+def save_upload(collection_path, fname, content):
+    os.makedirs(collection_path, exist_ok=True)
+    path = os.path.join(collection_path, fname)
+    # Written under a name the indexer and watcher ignore, then moved into place whole
+    tmp_path = path + ".part"
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+    return path
+
+def ingest_file(collection, fname, path):
+    """Serve a file's current content from the live segment; returns its chunk count.
+
+    Chunks of the published version that the new content lacks are
+    tombstoned, and chunks of a deleted file that comes back are restored.
+    Nothing is embedded when the published store or the live segment
+    already holds this content.
+    """
+    fhash = file_hash(path)
+    if live_index.file_hash(collection, fname) == fhash:
+        return live_index.files(collection).get(fname, 0)
+    chunks, entries, _ = chunk_file(fname, path, splitter, TABLE_EMBED_MAX_ROWS)
+    if not chunks:
+        forget_file(collection, fname)
+        # A large table's new rows are answered by the table engine straight away
+        answer_cache.invalidate()
+        return 0
+    chunk_ids = [entry["id"] for entry in entries]
+    tombstones.discard(collection, chunk_ids)
+    published = published_files(collection).get(fname)
+    if published is not None and published["hash"] != fhash:
+        superseded = {chunk["id"] for chunk in published["chunks"]} - set(chunk_ids)
+        if superseded:
+            tombstones.add(collection, superseded)
+    if published is None or published["hash"] != fhash:
+        # Through the embedding cache, so the folding build reuses these vectors
+        vectors = ingest_embeddings.embed_documents([chunk.page_content for chunk in chunks])
+        live_index.append(collection, fname, fhash, chunk_ids, chunks, np.asarray(vectors, dtype=np.float32))
+    else:
+        # Back to the published content: an edited live copy no longer applies
+        live_index.remove(collection, fname)
+    answer_cache.invalidate()
+    return len(chunks)
+
+def forget_file(collection, fname):
+    """Stop serving a file; returns ``(tombstoned chunk ids, whether it was live)``.
+
+    Ids of a live copy are tombstoned too (they are content-derived), since a
+    build that already read the file may still publish it.
+    """
+    chunk_ids = {chunk["id"] for chunk in published_files(collection).get(fname, {}).get("chunks", [])}
+    live_ids = live_index.remove(collection, fname)
+    chunk_ids.update(live_ids or ())
+    if chunk_ids:
+        tombstones.add(collection, chunk_ids)
+        answer_cache.invalidate()
+    return chunk_ids, live_ids is not None
+
+async def ingest_upload(upload, path):
+    collection, fname = upload["collection"], upload["filename"]
+    started = time.time()
+    try:
+        n_chunks = await run_cpu(ingest_file, collection, fname, path)
+        if not n_chunks:
+            if not await run_cpu(is_table_only, path, TABLE_EMBED_MAX_ROWS):
+                os.remove(path)
+                raise ValueError("no text could be extracted")
+            upload.update(status="indexed as table", chunks=0, searchable_after_sec=round(time.time() - started, 2))
+            print(f"📤 {collection}/{fname}: indexed as table in {upload['searchable_after_sec']}s")
+            build_jobs.submit({collection})
+            return
+        upload.update(status="searchable", chunks=n_chunks, searchable_after_sec=round(time.time() - started, 2))
+        print(f"📤 {collection}/{fname}: {n_chunks} chunks searchable in {upload['searchable_after_sec']}s")
+        build_jobs.submit({collection})
+    except Exception as e:
+        upload.update(status="failed", error=str(e))
+        print(f"❌ Upload {collection}/{fname} failed: {e}")
+    finally:
+        publish_upload(upload)
+
+@app.post("/upload", status_code=202)
+async def upload_document(
+    file: UploadFile = File(...),
+    collection: Optional[str] = Form(None),
+    replace: bool = Form(False),
+    user=Depends(get_current_user),
+):
+    collection = writable_collection(user, collection)
+    root, ext = os.path.splitext(os.path.basename(file.filename or ""))
+    fname = root + ext.lower()
+    if not root or not fname.endswith(SUPPORTED_EXTENSIONS):
+        raise HTTPException(status_code=400, detail=f"❌ Supported file types: {', '.join(SUPPORTED_EXTENSIONS)}")
+    content = await file.read(UPLOAD_MAX_BYTES + 1)
+    if len(content) > UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"❌ Uploads are limited to {UPLOAD_MAX_BYTES} bytes.")
+    if not replace and os.path.exists(os.path.join(DATA_DIR, collection, fname)):
+        raise HTTPException(
+            status_code=409, detail=f"❌ '{collection}/{fname}' already exists; send replace=true to overwrite it.",
+        )
+
+    path = await run_cpu(save_upload, os.path.join(DATA_DIR, collection), fname, content)
+    upload = {
+        "upload_id": str(uuid4()),
+        "status": "processing",
+        "collection": collection,
+        "filename": fname,
+        "uploaded_by": user["username"],
+        "bytes": len(content),
+        "chunks": None,
+        "error": None,
+    }
+    uploads[upload["upload_id"]] = upload
+    publish_upload(upload)
+    while len(uploads) > UPLOAD_HISTORY:
+        state.delete("uploads", uploads.popitem(last=False)[0])
+    task = asyncio.create_task(ingest_upload(upload, path))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return upload
+
+@app.get("/upload/{upload_id}")
+def upload_status(upload_id: str, user=Depends(get_current_user)):
+    upload = uploads.get(upload_id) or state.get("uploads", upload_id)
+    if upload is None:
+        raise HTTPException(status_code=404, detail=f"Upload '{upload_id}' not found.")
+    return upload
+
+def published_files(collection):
+    current_path = current_version_path(os.path.join(VECTOR_DIR, collection))
+    manifest = load_manifest(current_path) if current_path else None
+    return manifest["files"] if manifest else {}
+
+def remove_document(collection, fname):
+    files = published_files(collection)
+    path = os.path.join(DATA_DIR, collection, fname)
+    if fname not in files and fname not in live_index.files(collection) and not os.path.exists(path):
+        raise HTTPException(status_code=404, detail=f"❌ Document '{collection}/{fname}' not found.")
+
+    # Filtered out of every search from here on; the vectors stay until compaction
+    chunk_ids, was_live = forget_file(collection, fname)
+    if os.path.exists(path):
+        os.remove(path)
+
+    deleted, _ = tombstones.get(collection)
+    stored = {chunk["id"] for f in files.values() for chunk in f["chunks"]}
+    ratio = len(deleted & stored) / len(stored) if stored else 0.0
+    compacting = ratio >= COMPACTION_TOMBSTONE_RATIO
+    if compacting or was_live:
+        # A queued or running fold of the upload is followed by one that leaves the file out
+        build_jobs.submit({collection})
+    print(f"🗑️ Deleted {collection}/{fname}: {len(chunk_ids)} chunks tombstoned "
+          f"({ratio:.0%} of the collection{', compacting' if compacting else ''})")
+    return {
+        "status": "deleted",
+        "source_id": f"{collection}/{fname}",
+        "chunks_tombstoned": len(chunk_ids),
+        "tombstone_ratio": round(ratio, 4),
+        "compaction_scheduled": compacting,
+    }
 
-    if not os.path.exists(role_vector_path):
+@app.get("/documents/{collection}")
+def list_documents(collection: str, user=Depends(get_current_user)):
+    collection = writable_collection(user, collection)
+    deleted, _ = tombstones.get(collection)
+    documents = [
+        {"source_id": f"{collection}/{fname}", "chunks": len(f["chunks"]), "status": "indexed"}
+        for fname, f in sorted(published_files(collection).items())
+        if not all(chunk["id"] in deleted for chunk in f["chunks"])
+    ]
+    documents += [
+        {"source_id": f"{collection}/{fname}", "chunks": n_chunks, "status": "live"}
+        for fname, n_chunks in sorted(live_index.files(collection).items())
+    ]
+    return {"collection": collection, "documents": documents, "tombstoned_chunks": len(deleted)}
+
+@app.delete("/documents/{collection}/{filename}")
+async def delete_document(collection: str, filename: str, user=Depends(get_current_user)):
+    collection = writable_collection(user, collection)
+    return await run_cpu(remove_document, collection, os.path.basename(filename))
+
+@app.get("/vector_cache_stats")
+def vector_cache_stats():
+    return vector_cache.stats()
+
+@app.get("/live_index_stats")
+def live_index_stats():
+    return live_index.stats()
+
+def collections_for_role(role):
+    return expand_collections(ROLE_COLLECTIONS.get(role, [role]))
+
+def expand_collections(allowed):
+    if allowed == "*":
+        return sorted(c for c in os.listdir(DATA_DIR) if os.path.isdir(os.path.join(DATA_DIR, c)))
+    return allowed
+
+def get_role_stores(role):
+    """``({collection: RoleIndex}, version)`` for every published collection the role may read.
+
+    Stores are cached per collection, so roles sharing a collection share its vectors.
+    Uploads not yet folded into a collection's store are searched as an extra
+    ``<collection>+live`` store.
+    """
+    stores, versions = {}, []
+    for collection in collections_for_role(role):
+        collection_dir = os.path.join(VECTOR_DIR, collection)
+        version = current_version(collection_dir)
+        if version is not None:
+            stores[collection], key = cached_store(collection, version)
+            versions.append(f"{collection}@{key}")
+        live, generation = live_index.get(collection)
+        if live is not None:
+            stores[collection + LIVE_SUFFIX] = live
+            versions.append(f"{collection}{LIVE_SUFFIX}@{generation}")
+
+    if not stores:
         msg = f"❌ No vector store found for role '{role}'"
         print(msg)
         raise HTTPException(status_code=404, detail=msg)
+    return stores, "|".join(versions)
+
+def preload_indexes():
+    stores = {}
+    if not os.path.isdir(VECTOR_DIR):
+        return stores
+    for role in os.listdir(VECTOR_DIR):
+        role_dir = os.path.join(VECTOR_DIR, role)
+        version = current_version(role_dir)
+        if version:
+            stores[role], _ = cached_store(role, version)
+    return stores
 
+if PRELOAD_INDEXES:
+    # In the gunicorn master: workers forked afterwards share these pages instead of loading their own copies
+    embedding_model.load()
+    preload_indexes()
+
+async def retrieve_docs(stores, query, query_embedding=None):
+    """Search every collection concurrently and merge the hits into the top RETRIEVAL_K docs.
+
+    Without a query embedding only the lexical (BM25) side is searched.
+    """
+    results = await asyncio.gather(*(
+        run_cpu(search_collection, store, query, query_embedding, RETRIEVAL_FETCH_K)
+        for store in stores.values()
+    ))
+    keys = merge_results(dict(zip(stores, results)), RETRIEVAL_K, RRF_K)
+    return fetch_documents(stores, keys)
+
+async def table_docs(role, query):
+    """Run an aggregate/filter/sort question against the role's tables; None falls back to retrieval."""
+    tables, schema = await run_cpu(table_store.tables, collections_for_role(role))
+    chain = getattr(app.state, "table_plan_chain", None)
+    if not tables or chain is None or not mentions_tables(query, tables):
+        return None
     try:
-        print(f"📥 Loading vector store from: {role_vector_path}")
-        vectordb = FAISS.load_local(
-            folder_path=role_vector_path,
-            embeddings=embedding_model,
-            allow_dangerous_deserialization=True
-        )
-        retriever = vectordb.as_retriever(
-            search_type="mmr",
-            search_kwargs={
-                "k": 10,  # Increase to give the model more context to work with
-                "lambda_mult": 0.5  # 0.5 balances relevance (0.0) and diversity (1.0)
-            }
-        )
-        docs = retriever.invoke(query)
+        plan = await chain.ainvoke({"schema": schema, "query": query})
+        if not isinstance(plan, dict) or not plan.get("table"):
+            return None
+        result = await run_cpu(run_table_query, tables, plan, TABLE_RESULT_MAX_ROWS)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"❌ Retrieval error: {e}")
+        print(f"⚠️ Table query failed, falling back to retrieval: {e}")
+        return None
+    print(f"📊 Answered from table '{result.table}' ({result.matched} matching rows)")
+    return [Document(page_content=format_result(result), metadata={"source": result.table})]
+
+async def prepare_chat(role, query, cacheable=True):
+    """Embed the query once, then answer from the semantic cache or fetch context docs.
+
+    Follow-up questions (``cacheable=False``) depend on their conversation, so they skip the cache.
+    """
+    stores, version = await run_cpu(get_role_stores, role)
+
+    # 📊 Rankings, totals and filters over tabular data are computed, not retrieved
+    if is_analytical_query(query):
+        docs = await table_docs(role, query)
+        if docs:
+            return version, None, None, docs
+
+    # ⚡ Bare identifiers (e.g. FINEMP1000) are exact-match lookups: skip embedding entirely
+    if is_identifier_query(query):
+        docs = await retrieve_docs(stores, query)
+        if docs:
+            return version, None, None, docs
 
-    if not docs:
-        return {"response": "No relevant information found."}
+    query_embedding = await query_embedder.aembed(query)
+    cached_answer = answer_cache.lookup(role, version, query_embedding) if cacheable else None
+    docs = [] if cached_answer is not None else await retrieve_docs(stores, query, query_embedding)
+    return version, query_embedding, cached_answer, docs
 
-    context = "\n\n".join(doc.page_content for doc in docs)
+summarizing = set()
+background_tasks = set()
 
-    # 🔁 Get chat history
-    history = chat_memory[role]
-    formatted_history = ""
-    for i, (q, a) in enumerate(history):
-        formatted_history += f"\nUser: {q}\nFinBot: {a}"
+def remember_turn(conversation, query, answer):
+    memory.add_turn(conversation, query, answer)
+    # Fold turns that no longer fit the budget into the summary, off the request path
+    task = asyncio.create_task(summarize_overflow(conversation))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
 
-    prompt = PromptTemplate.from_template("""
+async def summarize_overflow(conversation):
+    if conversation in summarizing:
+        return
+    summarizing.add(conversation)
+    try:
+        summary, turns, upto_id = memory.overflow(conversation)
+        if not turns:
+            return
+        chain = getattr(app.state, "summary_chain", None)
+        if chain is not None:
+            transcript = "\n".join(f"User: {q}\nFinBot: {a}" for q, a in turns)
+            summary = (await chain.ainvoke({"summary": summary or "(none)", "turns": transcript})).strip()
+        # Without an LLM the overflowed turns are simply dropped
+        memory.save_summary(conversation, summary, upto_id)
+        print(f"🗜️ Summarised {len(turns)} older turns of conversation {conversation}")
+    except Exception as e:
+        print(f"⚠️ History summarisation failed: {e}")
+    finally:
+        summarizing.discard(conversation)
+
+def format_history(conversation):
+    # 🔁 Get chat history (summary of older turns + recent turns within the token budget)
+    return memory.format(conversation)
+
+
+# Prompts are compiled with the LLM client: importing langchain prompts loads transformers and torch
+FINBOT_TEMPLATE = """
     You are FinBot — a professional, intelligent assistant designed to assist users in finance with crisp, engaging, and secure replies. Your core directive is to **strictly adhere to financial topics and the provided context**.
 
     ---
@@ -319,22 +920,327 @@ def rag_chat(query: str = Form(...), role: str = Form(...)):
     <context>
     {context}
     </context>
-    """)
+    """
+
+SUMMARY_TEMPLATE = """
+    Update the running summary of a conversation between a user and FinBot, a finance assistant.
+    Keep facts, figures, names and open questions the user may refer back to. Be brief.
+
+    Current summary:
+    {summary}
+
+    New turns to fold in:
+    {turns}
+
+    Updated summary:
+    """
 
-    chain = LLMChain(llm=ChatGroq(model_name="llama3-8b-8192", api_key=GROQ_API_KEY), prompt=prompt)
+TABLE_PLAN_TEMPLATE = """
+    Translate the question into a query plan over the tables below. Reply with JSON only.
 
+    {schema}
+
+    Plan format:
+    {{"table": "<table name>",
+      "filters": [{{"column": "<column>", "op": "==|!=|>|>=|<|<=|in|contains", "value": <value>}}],
+      "group_by": ["<column>"],
+      "aggregations": [{{"column": "<column>", "func": "count|sum|mean|median|min|max|nunique"}}],
+      "sort": [{{"column": "<column>", "descending": true}}],
+      "columns": ["<column>"],
+      "limit": <number>}}
+
+    - Leave out keys you don't need. Aggregated columns are named <func>_<column>, e.g. mean_salary;
+      grouping without aggregations yields a "count" column. Sort on those names after aggregating.
+    - "columns" picks what to show for plain row results; include the columns the question asks about
+      plus identifying ones such as names.
+    - Dates are "YYYY-MM-DD" strings.
+    - If the tables cannot answer the question, reply {{"table": null}}.
+
+    Question: {query}
+    """
+
+def build_llm():
+    from langchain_groq import ChatGroq  # slow import; only paid by the background warmup
+
+    # One pooled keep-alive connection set per worker, shared by every chat
+    limits = httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_KEEPALIVE,
+        keepalive_expiry=LLM_KEEPALIVE_EXPIRY_SEC,
+    )
+    timeout = httpx.Timeout(LLM_TIMEOUT_SEC, connect=LLM_CONNECT_TIMEOUT_SEC)
+    http_client = httpx.Client(limits=limits, timeout=timeout)
+    http_async_client = httpx.AsyncClient(limits=limits, timeout=timeout)
+    llm = ChatGroq(
+        model_name=LLM_MODEL_NAME,
+        api_key=GROQ_API_KEY,
+        http_client=http_client,
+        http_async_client=http_async_client,
+        request_timeout=LLM_TIMEOUT_SEC,
+        max_retries=LLM_MAX_RETRIES,
+    )
+    return llm, http_client, http_async_client
+
+def build_chains(llm):
+    from langchain_core.output_parsers import JsonOutputParser, StrOutputParser
+    from langchain_core.prompts import PromptTemplate
+
+    return {
+        "finbot_chain": PromptTemplate.from_template(FINBOT_TEMPLATE) | llm | StrOutputParser(),
+        "summary_chain": (
+            PromptTemplate.from_template(SUMMARY_TEMPLATE) | llm.bind(max_tokens=SUMMARY_MAX_TOKENS) | StrOutputParser()
+        ),
+        "table_plan_chain": PromptTemplate.from_template(TABLE_PLAN_TEMPLATE) | llm.bind(temperature=0) | JsonOutputParser(),
+    }
+
+async def warmup_llm(llm):
+    # Open the TLS connection up front so the first real chat doesn't pay for it
     try:
-        answer = chain.run({
-            "context": context,
-            "query": query,
-            "role": role,
-            "history": formatted_history
-        })
-        print(f"✅ LLM Response: {answer[:300]}...\n")
+        await llm.ainvoke("ping", max_tokens=1)
+        print("🔥 LLM connection warmed up")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"❌ LLM error: {e}")
+        print(f"⚠️ LLM warmup failed: {e}")
+
+async def init_llm():
+    try:
+        llm, http_client, http_async_client = await run_cpu(build_llm)
+        app.state.llm_http_clients = (http_client, http_async_client)
+        for name, chain in (await run_cpu(build_chains, llm)).items():
+            setattr(app.state, name, chain)
+    except Exception as e:
+        print(f"❌ Could not create LLM client: {e}")
+        return
+    finally:
+        app.state.llm_initialised.set()
+    app.state.ready["llm"] = True
+    if LLM_WARMUP:
+        await warmup_llm(llm)
+
+async def warmup():
+    """Load the LLM client, embedding model and indexes, then run one query through them."""
+    started = time.time()
+    llm_task = asyncio.create_task(init_llm())
+    try:
+        query_embedding = await query_embedder.aembed(WARMUP_QUERY)
+        app.state.ready["embedding_model"] = True
+        stores = await run_cpu(preload_indexes)
+        if stores:
+            await retrieve_docs(stores, WARMUP_QUERY, query_embedding)
+        app.state.ready["indexes"] = True
+        print(f"🔥 Embedding model and {len(stores)} indexes warm in {time.time() - started:.1f}s")
+    except Exception as e:
+        print(f"❌ Warmup failed: {e}")
+    await llm_task
+
+@app.on_event("startup")
+async def start_warmup():
+    # Runs in the background so auth endpoints serve while models load
+    app.state.finbot_chain = None
+    app.state.summary_chain = None
+    app.state.table_plan_chain = None
+    app.state.llm_initialised = asyncio.Event()
+    app.state.ready = {"embedding_model": False, "indexes": False, "llm": False}
+    task = asyncio.create_task(warmup())
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+def apply_data_changes(changes):
+    """Data-dir watcher callback: changed files are served live at once, their collections fold later.
+
+    A collection folder added or removed as a whole, or a file that can't
+    be applied live, gets a full build of its collection right away.
+    """
+    rebuild = {collection for collection, fname in changes if fname is None}
+    for collection, fname in sorted(change for change in changes if change[1] is not None):
+        if collection in rebuild:
+            continue
+        path = os.path.join(DATA_DIR, collection, fname)
+        try:
+            if os.path.exists(path):
+                print(f"👀 {collection}/{fname}: {ingest_file(collection, fname, path)} chunks live")
+            else:
+                forget_file(collection, fname)
+                print(f"👀 {collection}/{fname}: removed")
+        except Exception as e:
+            print(f"❌ Could not apply {collection}/{fname} live, rebuilding its collection: {e}")
+            rebuild.add(collection)
+    if rebuild:
+        build_jobs.submit(rebuild)
+    data_folds.add({collection for collection, _ in changes} - rebuild)
+
+@app.on_event("startup")
+def start_data_watcher():
+    app.state.data_watcher = None
+    if not WATCH_DATA_DIR:
+        return
+    # Each worker watches, so every worker's live segment sees the change; the build lock
+    # serialises their folds and the later ones find nothing stale
+    app.state.data_watcher = DataDirWatcher(
+        DATA_DIR, apply_data_changes, SUPPORTED_EXTENSIONS,
+        debounce_sec=WATCH_DEBOUNCE_SEC,
+        max_delay_sec=WATCH_MAX_DELAY_SEC,
+    )
+    app.state.data_watcher.start()
+
+@app.on_event("shutdown")
+def stop_data_watcher():
+    if getattr(app.state, "data_watcher", None) is not None:
+        app.state.data_watcher.stop()
+    data_folds.cancel()
+
+@app.on_event("shutdown")
+async def close_llm():
+    clients = getattr(app.state, "llm_http_clients", None)
+    if clients:
+        clients[0].close()
+        await clients[1].aclose()
+
+async def finbot_chain():
+    # Chats that arrive during warmup wait for the LLM client instead of failing
+    await app.state.llm_initialised.wait()
+    chain = getattr(app.state, "finbot_chain", None)
+    if chain is None:
+        raise RuntimeError("LLM client is not initialised (check GROQ_API_KEY)")
+    return chain
+
+@app.get("/healthz")
+def healthz():
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz():
+    ready = dict(getattr(app.state, "ready", {}))
+    # The LLM is reported but not required: chats wait for it, and a bad key shouldn't block rollouts
+    if ready.get("embedding_model") and ready.get("indexes"):
+        return {"status": "ready", "components": ready}
+    return JSONResponse(status_code=503, content={"status": "warming up", "components": ready})
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.get("/answer_cache_stats")
+def answer_cache_stats():
+    return answer_cache.stats()
+
+@app.get("/table_stats")
+def table_stats():
+    return table_store.stats()
+
+@app.get("/query_embedder_stats")
+def query_embedder_stats():
+    return query_embedder.stats()
+
+@app.post("/rag_chat")
+async def rag_chat(
+    query: str = Form(...),
+    role: str = Form(...),
+    session_id: Optional[str] = Form(None),
+    user=Depends(get_optional_user),
+):
+    print(f"\n🟦 Received RAG Chat Request")
+    print(f"📝 Query: {query}")
+    print(f"👤 Role: {role}")
+
+    role = role.lower().strip()
+    conversation = chat_conversation(role, user, session_id)
+    # Answers shaped by earlier turns are neither served from nor stored in the shared cache
+    cacheable = not memory.has_history(conversation)
+
+    async with chat_slots:
+        try:
+            version, query_embedding, answer, docs = await prepare_chat(role, query, cacheable)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"❌ Retrieval error: {e}")
+
+        if answer is not None:
+            print("⚡ Answered from semantic cache")
+        elif not docs:
+            return {"response": "No relevant information found."}
+        else:
+            context = "\n\n".join(doc.page_content for doc in docs)
+
+            try:
+                answer = await (await finbot_chain()).ainvoke({
+                    "context": context,
+                    "query": query,
+                    "role": role,
+                    "history": format_history(conversation)
+                })
+                print(f"✅ LLM Response: {answer[:300]}...\n")
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"❌ LLM error: {e}")
+            if cacheable and query_embedding is not None:
+                answer_cache.store(role, version, query_embedding, query, answer)
 
     # 📝 Save current interaction in memory
-    chat_memory[role].append((query, answer))
+    remember_turn(conversation, query, answer)
 
     return {"response": answer}
+
+@app.post("/rag_chat_stream")
+async def rag_chat_stream(
+    query: str = Form(...),
+    role: str = Form(...),
+    session_id: Optional[str] = Form(None),
+    user=Depends(get_optional_user),
+):
+    print(f"\n🟦 Received streaming RAG Chat Request")
+    print(f"📝 Query: {query}")
+    print(f"👤 Role: {role}")
+
+    role = role.lower().strip()
+    conversation = chat_conversation(role, user, session_id)
+    cacheable = not memory.has_history(conversation)
+    await run_cpu(get_role_stores, role)
+
+    async def events():
+        async with chat_slots:
+            try:
+                version, query_embedding, cached_answer, docs = await prepare_chat(role, query, cacheable)
+            except Exception as e:
+                yield sse_event("error", {"detail": f"❌ Retrieval error: {e}"})
+                return
+
+            yield sse_event("retrieval", {"chunks": len(docs), "cached": cached_answer is not None})
+            if cached_answer is not None:
+                print("⚡ Answered from semantic cache")
+                remember_turn(conversation, query, cached_answer)
+                yield sse_event("token", {"text": cached_answer})
+                yield sse_event("done", {"response": cached_answer})
+                return
+            if not docs:
+                answer = "No relevant information found."
+                yield sse_event("token", {"text": answer})
+                yield sse_event("done", {"response": answer})
+                return
+
+            context = "\n\n".join(doc.page_content for doc in docs)
+            parts = []
+            try:
+                async for token in (await finbot_chain()).astream({
+                    "context": context,
+                    "query": query,
+                    "role": role,
+                    "history": format_history(conversation)
+                }):
+                    parts.append(token)
+                    yield sse_event("token", {"text": token})
+            except Exception as e:
+                yield sse_event("error", {"detail": f"❌ LLM error: {e}"})
+                return
+
+        answer = "".join(parts)
+        print(f"✅ LLM Response: {answer[:300]}...\n")
+        if cacheable and query_embedding is not None:
+            answer_cache.store(role, version, query_embedding, query, answer)
+        # 📝 Save current interaction in memory
+        remember_turn(conversation, query, answer)
+        yield sse_event("done", {"response": answer})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,109 @@
+"""Compare FAISS index types against exact (flat) search.
+
+Reports recall@k versus flat, p50/p99 single-query latency and index bytes
+for every index type. Vectors come from a built collection (its exact
+vectors) or, with ``--synthetic N``, from random data of the model's
+dimension, since the sample documents are too small for IVF-PQ to train.
+
+Run from ``app/``::
+
+    python -m scripts.benchmark_index --collection marketing
+    python -m scripts.benchmark_index --synthetic 200000 --queries 500
+"""
+import argparse
+import os
+import time
+
+import faiss
+import numpy as np
+
+from services.ann import INDEX_TYPES, build_index, index_bytes, index_spec, load_exact_index, search_params
+from services.indexing import current_version_path
+
+VECTOR_DIR = "./faiss_vectors"
+
+
+def load_vectors(collection):
+    path = current_version_path(os.path.join(VECTOR_DIR, collection))
+    if path is None:
+        raise SystemExit(f"❌ No vector store found for collection '{collection}' (run /build_vectors first)")
+    index = load_exact_index(path) or faiss.read_index(os.path.join(path, "index.faiss"))
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def make_queries(vectors, n_queries, rng):
+    # Perturbed copies of stored vectors behave like real queries that land near some chunks
+    picks = vectors[rng.integers(0, len(vectors), n_queries)]
+    noise = rng.normal(0, picks.std() * 0.5, picks.shape).astype(np.float32)
+    return picks + noise
+
+
+def timed_search(index, queries, k, params):
+    latencies = []
+    results = []
+    for query in queries:
+        started = time.perf_counter()
+        _, positions = index.search(query[None, :], k, params=params)
+        latencies.append((time.perf_counter() - started) * 1000)
+        results.append(positions[0])
+    return np.array(results), np.array(latencies)
+
+
+def recall_at_k(results, truth):
+    hits = sum(len(set(r[r >= 0]) & set(t)) for r, t in zip(results, truth))
+    return hits / truth.size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--collection", help="benchmark the vectors of a built collection")
+    source.add_argument("--synthetic", type=int, metavar="N", help="benchmark N random vectors")
+    parser.add_argument("--dim", type=int, default=384, help="dimension of synthetic vectors")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--types", nargs="+", default=list(INDEX_TYPES), choices=INDEX_TYPES)
+    parser.add_argument("--hnsw-m", type=int, default=32)
+    parser.add_argument("--ef-construction", type=int, default=80)
+    parser.add_argument("--ef-search", type=int, default=64)
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--pq-m", type=int, default=16)
+    parser.add_argument("--pq-nbits", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    if args.collection:
+        vectors = load_vectors(args.collection)
+    else:
+        vectors = rng.standard_normal((args.synthetic, args.dim)).astype(np.float32)
+    queries = make_queries(vectors, args.queries, rng)
+    k = min(args.k, len(vectors))
+    print(f"📊 {len(vectors)} vectors (dim {vectors.shape[1]}), {len(queries)} queries, k={k}\n")
+
+    flat = build_index(vectors, index_spec("flat"))
+    truth, _ = timed_search(flat, queries, k, None)
+
+    print(f"{'index':<8} {'build s':>8} {'recall@k':>9} {'p50 ms':>8} {'p99 ms':>8} {'bytes':>14}")
+    for index_type in args.types:
+        spec = index_spec(
+            index_type,
+            hnsw_m=args.hnsw_m,
+            hnsw_ef_construction=args.ef_construction,
+            ivf_nlist=args.nlist,
+            pq_m=args.pq_m,
+            pq_nbits=args.pq_nbits,
+        )
+        started = time.perf_counter()
+        index = build_index(vectors, spec)
+        build_sec = time.perf_counter() - started
+        params = search_params(index, nprobe=args.nprobe, ef_search=args.ef_search)
+        results, latencies = timed_search(index, queries, k, params)
+        print(f"{index_type:<8} {build_sec:>8.2f} {recall_at_k(results, truth):>9.3f} "
+              f"{np.percentile(latencies, 50):>8.3f} {np.percentile(latencies, 99):>8.3f} "
+              f"{index_bytes(index):>14,}")
+
+
+if __name__ == "__main__":
+    main()
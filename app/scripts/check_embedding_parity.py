@@ -0,0 +1,78 @@
+"""Check that ONNX Runtime embeddings match the PyTorch ones, and compare throughput.
+
+Embeds chunks of the bundled documents with the PyTorch model and each
+ONNX backend, reports min/mean cosine similarity, max abs difference and
+texts/sec, and exits non-zero if any backend falls below ``--min-cosine``.
+
+Run from ``app/``::
+
+    python -m scripts.check_embedding_parity
+    python -m scripts.check_embedding_parity --backends onnx-int8 --threads 4
+"""
+import argparse
+import os
+import sys
+import time
+
+from services.chunking import MarkdownChunker
+from services.embedding_backends import create_embeddings, embedding_parity
+from services.indexing import chunk_file, list_source_files
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "resources", "data")
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+# Same chunking settings (and environment variables) as main.py, so the chunks compared are the ones indexed
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "250"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "25"))
+CHUNK_MIN_SIZE = int(os.getenv("CHUNK_MIN_SIZE", "64"))
+TABLE_EMBED_MAX_ROWS = int(os.getenv("TABLE_EMBED_MAX_ROWS", "10000"))
+
+
+def sample_texts(limit, model_name=EMBEDDING_MODEL_NAME):
+    splitter = MarkdownChunker(model_name, CHUNK_SIZE, CHUNK_OVERLAP, CHUNK_MIN_SIZE)
+    texts = []
+    for collection in sorted(os.listdir(DATA_DIR)):
+        collection_path = os.path.join(DATA_DIR, collection)
+        for fname in list_source_files(collection_path):
+            chunks, _, _ = chunk_file(fname, os.path.join(collection_path, fname), splitter, TABLE_EMBED_MAX_ROWS)
+            texts.extend(chunk.page_content for chunk in chunks)
+    return texts[:limit]
+
+
+def throughput(model, texts):
+    started = time.perf_counter()
+    model.embed_documents(texts)
+    return len(texts) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=EMBEDDING_MODEL_NAME)
+    parser.add_argument("--backends", nargs="+", default=["onnx", "onnx-int8"], choices=["onnx", "onnx-int8"])
+    parser.add_argument("--samples", type=int, default=256)
+    parser.add_argument("--threads", type=int, default=None, help="ONNX Runtime intra-op threads")
+    parser.add_argument("--onnx-dir", default="./onnx_models")
+    parser.add_argument("--min-cosine", type=float, default=0.99)
+    args = parser.parse_args()
+
+    texts = sample_texts(args.samples, args.model)
+    print(f"📊 {len(texts)} chunks from {DATA_DIR}\n")
+    reference = create_embeddings("torch", args.model)
+    reference.embed_documents(texts[:4])  # warm up
+    print(f"{'backend':<10} {'min cos':>9} {'mean cos':>9} {'max |diff|':>11} {'texts/s':>9}")
+    print(f"{'torch':<10} {1:>9.5f} {1:>9.5f} {0:>11.6f} {throughput(reference, texts):>9.1f}")
+
+    failed = False
+    for backend in args.backends:
+        model = create_embeddings(backend, args.model, onnx_dir=args.onnx_dir, threads=args.threads)
+        model.embed_documents(texts[:4])
+        parity = embedding_parity(model, reference, texts)
+        ok = parity["min_cosine"] >= args.min_cosine
+        failed = failed or not ok
+        print(f"{backend:<10} {parity['min_cosine']:>9.5f} {parity['mean_cosine']:>9.5f} "
+              f"{parity['max_abs_diff']:>11.6f} {throughput(model, texts):>9.1f} {'✅' if ok else '❌'}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Profile how long importing the app takes, and which modules it spends it on.
+
+Runs ``python -X importtime -c "import main"`` in a fresh interpreter and
+prints the total and the slowest modules by cumulative time. With
+``--max-ms`` it exits non-zero when the import is slower, so a heavy
+module-level import creeping back in fails the check.
+
+Run from ``app/``::
+
+    python -m scripts.profile_imports
+    python -m scripts.profile_imports --top 30 --max-ms 3000
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+# import time:   self [us] |  cumulative | imported package
+IMPORTTIME_RE = re.compile(r"^import time:\s+\d+\s+\|\s+(\d+)\s+\|\s*(\S+)")
+
+
+def import_times(module):
+    """``[(module, cumulative_us)]`` in import order."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=APP_DIR, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"❌ Importing {module} failed:\n{result.stderr[-2000:]}")
+    times = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match:
+            cumulative_us, name = match.groups()
+            times.append((name, int(cumulative_us)))
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--max-ms", type=float, default=None, help="fail if the import takes longer")
+    args = parser.parse_args()
+
+    times = import_times(args.module)
+    total_ms = next(cumulative for name, cumulative in times if name == args.module) / 1000
+    print(f"📊 import {args.module}: {total_ms:.0f} ms\n")
+
+    # Top-level packages only, so a slow package isn't listed once per submodule
+    packages = {}
+    for name, cumulative_us in times:
+        if name == args.module:
+            continue
+        root = name.split(".")[0]
+        packages[root] = max(packages.get(root, 0), cumulative_us)
+    print(f"{'package':<32} {'cumulative ms':>14}")
+    for name, cumulative_us in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{name:<32} {cumulative_us / 1000:>14.1f}")
+
+    if args.max_ms is not None and total_ms > args.max_ms:
+        print(f"\n❌ Import took {total_ms:.0f} ms (limit {args.max_ms:.0f} ms)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import os
+import struct
+
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("flat", "hnsw", "ivfpq")
+# Non-flat stores keep the exact vectors here (for incremental builds) and the
+# approximate index in index.faiss, which is all that queries load
+EXACT_INDEX_FILE = "exact.faiss"
+SERVING_INDEX_FILE = "index.faiss"
+# Approximate indexes are trained on a random sample of this many vectors per centroid / PQ code
+TRAIN_POINTS_PER_CENTROID = 64
+
+
+def index_spec(index_type="flat", hnsw_m=32, hnsw_ef_construction=80, ivf_nlist=1024, pq_m=16, pq_nbits=8):
+    """Build-time settings of one index type, as stored in a role's manifest."""
+    if index_type == "flat":
+        return {"type": "flat"}
+    if index_type == "hnsw":
+        return {"type": "hnsw", "m": hnsw_m, "ef_construction": hnsw_ef_construction}
+    if index_type == "ivfpq":
+        return {"type": "ivfpq", "nlist": ivf_nlist, "pq_m": pq_m, "pq_nbits": pq_nbits}
+    raise ValueError(f"Unknown index type '{index_type}' (expected one of {', '.join(INDEX_TYPES)})")
+
+
+def _new_index(n, d, spec):
+    """An empty index for ``n`` vectors of dim ``d`` as ``spec`` describes, and its training sample size.
+
+    IVF-PQ needs enough vectors to train its coarse quantizer and codebooks;
+    smaller stores fall back to HNSW, which needs no training.
+    """
+    if spec["type"] == "ivfpq":
+        nlist = max(1, min(spec["nlist"], n // 39))
+        if n < max(39 * nlist, 2 ** spec["pq_nbits"]) or d % spec["pq_m"]:
+            print(f"⚠️ IVF-PQ can't be trained on {n} vectors of dim {d}; using HNSW")
+            return _new_index(n, d, index_spec("hnsw"))
+        index = faiss.IndexIVFPQ(faiss.IndexFlatL2(d), d, nlist, spec["pq_m"], spec["pq_nbits"])
+        return index, min(n, TRAIN_POINTS_PER_CENTROID * max(nlist, 2 ** spec["pq_nbits"]))
+    if spec["type"] == "hnsw":
+        index = faiss.IndexHNSWFlat(d, spec["m"])
+        index.hnsw.efConstruction = spec["ef_construction"]
+        return index, 0
+    return faiss.IndexFlatL2(d), 0
+
+
+def _sample_positions(n, size, seed=0):
+    return np.sort(np.random.default_rng(seed).choice(n, size=size, replace=False)).astype(np.int64)
+
+
+def build_index(vectors, spec):
+    """Build (and train on a sample, if needed) the index described by ``spec`` over in-memory ``vectors``."""
+    n, d = vectors.shape
+    index, train_size = _new_index(n, d, spec)
+    if train_size:
+        index.train(vectors[_sample_positions(n, train_size)])
+    index.add(vectors)
+    return index
+
+
+def exact_index_file(spec):
+    """File the exact vectors of a store go to: the serving index itself for flat stores."""
+    return SERVING_INDEX_FILE if spec["type"] == "flat" else EXACT_INDEX_FILE
+
+
+class FlatIndexWriter:
+    """Writes an exact ``IndexFlatL2`` file batch by batch, without holding its vectors in memory.
+
+    The file is FAISS's own serialization of an empty flat index with the
+    vectors appended and the counts patched in on close, so it reads (and
+    memory-maps) like any file written by ``faiss.write_index``.
+    """
+
+    # Byte offset of ntotal in the header; the header ends with the float count of the vectors
+    NTOTAL_OFFSET = 8
+
+    def __init__(self, path):
+        self.path = path
+        self.ntotal = 0
+        self._d = None
+        self._header_size = 0
+        self._file = open(path, "wb")
+
+    def add(self, vectors):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if self._d is None:
+            self._d = vectors.shape[1]
+            header = faiss.serialize_index(faiss.IndexFlatL2(self._d)).tobytes()
+            if header[:4] != b"IxF2" or header[-8:] != bytes(8):
+                raise RuntimeError("Unexpected FAISS flat index layout")
+            self._file.write(header)
+            self._header_size = len(header)
+        self._file.write(vectors.tobytes())
+        self.ntotal += len(vectors)
+
+    def close(self):
+        """Finish the file and return its vector count; the file is removed if nothing was added."""
+        try:
+            if self._d is not None:
+                self._file.seek(self.NTOTAL_OFFSET)
+                self._file.write(struct.pack("<q", self.ntotal))
+                self._file.seek(self._header_size - 8)
+                self._file.write(struct.pack("<Q", self.ntotal * self._d))
+        finally:
+            self._file.close()
+        if self._d is None:
+            os.remove(self.path)
+        return self.ntotal
+
+
+def build_serving_index(folder, spec, batch_size=10000):
+    """Build the approximate serving index of a store from its exact vectors on disk.
+
+    The exact index is memory-mapped; training reads a random sample of it
+    and vectors are added ``batch_size`` at a time, so only the index being
+    built is held in memory. Positions are preserved, so position-keyed
+    chunk data stays valid for both.
+    """
+    exact = load_exact_index(folder, mmap=True)
+    n = exact.ntotal
+    index, train_size = _new_index(n, exact.d, spec)
+    if train_size:
+        index.train(exact.reconstruct_batch(_sample_positions(n, train_size)))
+    for start in range(0, n, batch_size):
+        index.add(exact.reconstruct_n(start, min(batch_size, n - start)))
+    faiss.write_index(index, os.path.join(folder, SERVING_INDEX_FILE))
+
+
+def load_serving_index(folder):
+    """Memory-map the serving index read-only: pages come from the shared OS page cache."""
+    return faiss.read_index(
+        os.path.join(folder, SERVING_INDEX_FILE), faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+    )
+
+
+def load_exact_index(folder, mmap=False):
+    """The exact index of a saved store, or None if the serving index already is exact."""
+    path = os.path.join(folder, EXACT_INDEX_FILE)
+    if not os.path.exists(path):
+        return None
+    return faiss.read_index(path, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY) if mmap else faiss.read_index(path)
+
+
+def search_params(index, nprobe=16, ef_search=64, excluded_positions=None):
+    """Per-query FAISS search parameters matching the index type (None for flat).
+
+    ``excluded_positions`` are skipped inside the search itself, so deleted
+    vectors never take up any of the ``k`` results.
+    """
+    extra = {}
+    if excluded_positions is not None and len(excluded_positions):
+        positions = np.asarray(excluded_positions, dtype=np.int64)
+        extra["sel"] = faiss.IDSelectorNot(faiss.IDSelectorBatch(positions))
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(efSearch=ef_search, **extra)
+    if isinstance(index, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(nprobe=nprobe, **extra)
+    return faiss.SearchParameters(**extra) if extra else None
+
+
+def index_bytes(index):
+    return len(faiss.serialize_index(index))
@@ -0,0 +1,102 @@
+import threading
+import time
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """Per-role cache of answers looked up by query-embedding similarity.
+
+    A lookup hits when a stored query's cosine similarity to the new one is at
+    least ``threshold`` and the entry is younger than ``ttl_sec``. Each role
+    keeps at most ``max_entries`` answers (least recently used go first) and is
+    tied to the index version it was answered from; a different version clears it.
+    """
+
+    def __init__(self, threshold=0.95, ttl_sec=3600, max_entries=256):
+        self.threshold = threshold
+        self.ttl_sec = ttl_sec
+        self.max_entries = max_entries
+        self._roles = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _role_locked(self, role, version):
+        bucket = self._roles.get(role)
+        if bucket is None or bucket["version"] != version:
+            bucket = {"version": version, "entries": [], "matrix": None}
+            self._roles[role] = bucket
+        return bucket
+
+    def _expire_locked(self, bucket, now):
+        fresh = [e for e in bucket["entries"] if now - e["created_at"] < self.ttl_sec]
+        if len(fresh) != len(bucket["entries"]):
+            bucket["entries"] = fresh
+            bucket["matrix"] = None
+
+    def lookup(self, role, version, embedding):
+        """Return the cached answer for a near-duplicate query, or None."""
+        query = self._normalize(embedding)
+        now = time.time()
+        with self._lock:
+            bucket = self._role_locked(role, version)
+            self._expire_locked(bucket, now)
+            if not bucket["entries"]:
+                self.misses += 1
+                return None
+            if bucket["matrix"] is None:
+                bucket["matrix"] = np.stack([e["embedding"] for e in bucket["entries"]])
+            scores = bucket["matrix"] @ query
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+            entry = bucket["entries"][best]
+            entry["last_used"] = now
+            entry["hits"] += 1
+            self.hits += 1
+            return entry["answer"]
+
+    def store(self, role, version, embedding, query, answer):
+        now = time.time()
+        with self._lock:
+            bucket = self._role_locked(role, version)
+            entries = bucket["entries"]
+            entries.append({
+                "embedding": self._normalize(embedding),
+                "query": query,
+                "answer": answer,
+                "created_at": now,
+                "last_used": now,
+                "hits": 0,
+            })
+            if len(entries) > self.max_entries:
+                entries.remove(min(entries, key=lambda e: e["last_used"]))
+            bucket["matrix"] = None
+
+    def invalidate(self, role=None):
+        with self._lock:
+            if role is None:
+                self._roles.clear()
+            else:
+                self._roles.pop(role, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "entries": {role: len(b["entries"]) for role, b in self._roles.items()},
+                "threshold": self.threshold,
+                "ttl_sec": self.ttl_sec,
+                "max_entries": self.max_entries,
+            }
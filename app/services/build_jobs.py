@@ -0,0 +1,159 @@
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
+
+from filelock import FileLock
+
+
+class BuildJob:
+    """Progress record of one background vector build.
+
+    ``on_change`` is called with the job after updates (throttled to every
+    ``publish_interval`` seconds unless forced) so other workers can poll it.
+    ``collections`` limits the build to those collections (None: all of them).
+    A role's clock starts when it is marked ``running``, so time spent queued
+    behind other roles doesn't count towards its ``elapsed_sec``.
+    """
+
+    def __init__(self, on_change=None, publish_interval=0.5, collections=None):
+        self.id = str(uuid4())
+        self.status = "queued"
+        self.collections = set(collections) if collections is not None else None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.roles = {}
+        self.details = {}
+        self.error = None
+        self._lock = threading.Lock()
+        self._on_change = on_change
+        self._publish_interval = publish_interval
+        self._published_at = 0.0
+
+    def update_role(self, role, **fields):
+        with self._lock:
+            progress = self.roles.setdefault(role, {
+                "status": "queued",
+                "files_total": 0,
+                "files_loaded": 0,
+                "chunks_total": 0,
+                "chunks_embedded": 0,
+                "started_at": None,
+            })
+            if progress["status"] in ("completed", "failed"):
+                # Progress a build worker sent before finishing can arrive late; it doesn't reopen the role
+                fields.pop("status", None)
+            if fields.get("status") == "running" and progress["started_at"] is None:
+                progress["started_at"] = time.time()
+            progress.update(fields)
+        self.changed()
+
+    def changed(self, force=False):
+        if self._on_change is None:
+            return
+        now = time.time()
+        if force or now - self._published_at >= self._publish_interval:
+            self._published_at = now
+            self._on_change(self)
+
+    def to_dict(self):
+        with self._lock:
+            now = self.finished_at or time.time()
+            roles = {}
+            for role, progress in self.roles.items():
+                progress = dict(progress)
+                started_at, finished_at = progress.pop("started_at"), progress.pop("finished_at", now)
+                elapsed = finished_at - started_at if started_at is not None else 0.0
+                progress["elapsed_sec"] = round(elapsed, 2)
+                progress["chunks_per_sec"] = round(progress["chunks_embedded"] / elapsed, 1) if elapsed > 0 else 0.0
+                roles[role] = progress
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "collections": sorted(self.collections) if self.collections is not None else None,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "roles": roles,
+                "details": dict(self.details),
+                "error": self.error,
+            }
+
+
+class BuildJobManager:
+    """Runs vector builds one at a time on a background thread.
+
+    Builds run one after another, since two would race on the same role
+    stores. Submitting while a build is still queued returns that job (widened
+    to the new ``collections``) instead of queueing another; submitting while
+    one is running queues a follow-up, as the running build may have read the
+    files already. With a shared ``state`` backend and ``lock_path``, job progress is visible
+    from every worker and builds are serialised across processes too.
+    """
+
+    def __init__(self, run_build, state=None, lock_path=None, max_history=50):
+        self._run_build = run_build
+        self._state = state
+        self._file_lock = FileLock(lock_path) if lock_path else None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="build-vectors")
+        self._jobs = OrderedDict()
+        self._active = None
+        self._max_history = max_history
+        self._lock = threading.Lock()
+
+    def submit(self, collections=None):
+        with self._lock:
+            if self._active is not None and self._active.status == "queued":
+                if self._active.collections is not None:
+                    if collections is None:
+                        self._active.collections = None
+                    else:
+                        self._active.collections |= set(collections)
+                return self._active
+            job = BuildJob(on_change=self._publish, collections=collections)
+            self._jobs[job.id] = job
+            while len(self._jobs) > self._max_history:
+                self._jobs.popitem(last=False)
+            self._active = job
+        job.changed(force=True)
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        """Progress dict of a job started by this or (with a shared state) any other worker."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        if self._state is not None:
+            return self._state.get("build_jobs", job_id)
+        return None
+
+    def _publish(self, job):
+        if self._state is not None:
+            self._state.set("build_jobs", job.id, job.to_dict())
+
+    def _run(self, job):
+        try:
+            if self._file_lock is not None:
+                # Another worker may be building right now; wait our turn
+                self._file_lock.acquire()
+            with self._lock:
+                # From here on submit() queues a new job rather than widening this one
+                job.status = "running"
+            job.started_at = time.time()
+            job.changed(force=True)
+            self._run_build(job)
+            job.status = "completed"
+        except Exception as e:
+            traceback.print_exc()
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            if self._file_lock is not None and self._file_lock.is_locked:
+                self._file_lock.release()
+            job.finished_at = time.time()
+            job.changed(force=True)
@@ -0,0 +1,152 @@
+import re
+import threading
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+FENCE_RE = re.compile(r"^\s*(```|~~~)")
+SECTION_SEPARATOR = " > "
+
+
+def markdown_sections(text):
+    """Split markdown into ``(heading_path, text)`` sections, one per heading.
+
+    Each section's text starts with its own heading line; ``#`` lines inside
+    fenced code blocks are not headings. Text before the first heading gets
+    an empty path.
+    """
+    sections = []
+    path = []
+    lines = []
+    in_fence = False
+
+    def flush():
+        body = "\n".join(lines).strip()
+        if body:
+            sections.append((tuple(title for _, title in path), body))
+
+    for line in text.splitlines():
+        if FENCE_RE.match(line):
+            in_fence = not in_fence
+        heading = None if in_fence else HEADING_RE.match(line)
+        if heading:
+            flush()
+            lines = []
+            level = len(heading.group(1))
+            path = [(lvl, title) for lvl, title in path if lvl < level] + [(level, heading.group(2))]
+        lines.append(line)
+    flush()
+    return sections
+
+
+def _common_prefix(paths):
+    prefix = []
+    for titles in zip(*paths):
+        if len(set(titles)) != 1:
+            break
+        prefix.append(titles[0])
+    return tuple(prefix)
+
+
+class MarkdownChunker:
+    """Heading-aware chunking sized in embedding-model tokens.
+
+    Markdown is split at headings, and consecutive sections of the same
+    chapter (top-level heading below the document title) are packed together
+    while they fit in ``chunk_size`` tokens; sections shorter than
+    ``min_chunk_size`` are merged even across chapters. Only sections too
+    long for one chunk are split further, by paragraph and sentence with
+    ``chunk_overlap`` tokens of overlap. Each chunk records its heading path in ``metadata["section"]``.
+    Other documents (CSV rows) are only split if they exceed ``chunk_size``.
+
+    Has the ``split_documents`` interface of a LangChain text splitter, and
+    pickles without its tokenizer, which each build process loads on first use.
+    """
+
+    def __init__(self, tokenizer_name, chunk_size=250, chunk_overlap=25, min_chunk_size=64):
+        self.tokenizer_name = tokenizer_name
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.min_chunk_size = min_chunk_size
+        self._tokenizer = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_tokenizer"] = None
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def tokenizer(self):
+        with self._lock:
+            if self._tokenizer is None:
+                from transformers import AutoTokenizer
+
+                # The raw fast tokenizer: encode() doesn't mutate it, so loader threads can share it
+                tokenizer = AutoTokenizer.from_pretrained(self.tokenizer_name).backend_tokenizer
+                tokenizer.no_truncation()
+                tokenizer.no_padding()
+                self._tokenizer = tokenizer
+            return self._tokenizer
+
+    def count_tokens(self, text):
+        return len(self.tokenizer.encode(text, add_special_tokens=False).ids)
+
+    def _splitter(self):
+        return RecursiveCharacterTextSplitter(
+            chunk_size=self.chunk_size,
+            chunk_overlap=self.chunk_overlap,
+            length_function=self.count_tokens,
+            separators=["\n\n", "\n", ". ", " ", ""],
+        )
+
+    def _pack(self, sections):
+        """Greedily merge consecutive ``(path, text, tokens)`` sections into chunk-sized groups."""
+        # Chapters are the first heading level below any title shared by the whole document
+        chapter_depth = len(_common_prefix([path for path, _, _ in sections])) + 1
+        groups = []
+        for path, text, tokens in sections:
+            if groups:
+                group = groups[-1]
+                same_chapter = group["paths"][0][:chapter_depth] == path[:chapter_depth]
+                # The "\n\n" joining two sections costs about one token
+                fits = group["tokens"] + tokens + 1 <= self.chunk_size
+                if fits and (same_chapter or group["tokens"] < self.min_chunk_size or tokens < self.min_chunk_size):
+                    group["paths"].append(path)
+                    group["texts"].append(text)
+                    group["tokens"] += tokens + 1
+                    continue
+            groups.append({"paths": [path], "texts": [text], "tokens": tokens})
+        return [(_common_prefix(group["paths"]), "\n\n".join(group["texts"])) for group in groups]
+
+    def split_markdown(self, doc):
+        sections = [(path, text, self.count_tokens(text)) for path, text in markdown_sections(doc.page_content)]
+        splitter = None
+        chunks = []
+        for path, text in self._pack(sections):
+            metadata = dict(doc.metadata, section=SECTION_SEPARATOR.join(path))
+            if self.count_tokens(text) <= self.chunk_size:
+                chunks.append(Document(page_content=text, metadata=metadata))
+                continue
+            splitter = splitter or self._splitter()
+            chunks.extend(Document(page_content=piece, metadata=metadata) for piece in splitter.split_text(text))
+        return chunks
+
+    def split_documents(self, docs):
+        chunks = []
+        splitter = None
+        for doc in docs:
+            if doc.metadata.get("source", "").endswith(".md"):
+                chunks.extend(self.split_markdown(doc))
+            elif self.count_tokens(doc.page_content) <= self.chunk_size:
+                chunks.append(doc)
+            else:
+                splitter = splitter or self._splitter()
+                chunks.extend(splitter.split_documents([doc]))
+        return chunks
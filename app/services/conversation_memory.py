@@ -0,0 +1,114 @@
+import math
+import time
+
+from utils.sqlite import SQLiteConnections
+
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS turns (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        conversation TEXT NOT NULL,
+        query TEXT NOT NULL,
+        answer TEXT NOT NULL,
+        tokens INTEGER NOT NULL,
+        created_at REAL NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS turns_conversation ON turns (conversation, id)",
+    """CREATE TABLE IF NOT EXISTS summaries (
+        conversation TEXT PRIMARY KEY,
+        summary TEXT NOT NULL,
+        tokens INTEGER NOT NULL,
+        upto_id INTEGER NOT NULL
+    )""",
+)
+
+
+def estimate_tokens(text):
+    # ~4 characters per token for English with Llama-style tokenizers
+    return max(1, math.ceil(len(text) / 4))
+
+
+def conversation_key(role, username=None, session_id=None):
+    return f"{username or ''}|{role}|{session_id or 'default'}"
+
+
+class ConversationMemory:
+    """Per-conversation chat history in SQLite, trimmed to a token budget.
+
+    :meth:`window` returns the running summary plus the newest turns that fit
+    in ``token_budget``. Older turns are handed out by :meth:`overflow` so the
+    caller can fold them into the summary; :meth:`save_summary` then deletes
+    them, so storage per conversation stays bounded as well.
+    """
+
+    def __init__(self, path, token_budget=1000, count_tokens=estimate_tokens):
+        self.token_budget = token_budget
+        self.count_tokens = count_tokens
+        self._connections = SQLiteConnections(path)
+        conn = self._connections.get()
+        for statement in SCHEMA:
+            conn.execute(statement)
+
+    def add_turn(self, conversation, query, answer):
+        tokens = self.count_tokens(f"User: {query}\nFinBot: {answer}")
+        self._connections.get().execute(
+            "INSERT INTO turns (conversation, query, answer, tokens, created_at) VALUES (?, ?, ?, ?, ?)",
+            (conversation, query, answer, tokens, time.time()),
+        )
+
+    def _summary(self, conversation):
+        row = self._connections.get().execute(
+            "SELECT summary, tokens, upto_id FROM summaries WHERE conversation = ?", (conversation,)
+        ).fetchone()
+        return dict(row) if row else {"summary": "", "tokens": 0, "upto_id": 0}
+
+    def _split(self, conversation):
+        summary = self._summary(conversation)
+        rows = self._connections.get().execute(
+            "SELECT id, query, answer, tokens FROM turns WHERE conversation = ? AND id > ? ORDER BY id DESC",
+            (conversation, summary["upto_id"]),
+        ).fetchall()
+        budget = self.token_budget - summary["tokens"]
+        recent = []
+        for n, row in enumerate(rows):
+            if row["tokens"] > budget:
+                return summary, list(reversed(recent)), list(reversed(rows[n:]))
+            budget -= row["tokens"]
+            recent.append(row)
+        return summary, list(reversed(recent)), []
+
+    def has_history(self, conversation):
+        """Whether the conversation has earlier turns (or a summary of them)."""
+        conn = self._connections.get()
+        return bool(
+            conn.execute("SELECT 1 FROM turns WHERE conversation = ? LIMIT 1", (conversation,)).fetchone()
+            or conn.execute("SELECT 1 FROM summaries WHERE conversation = ?", (conversation,)).fetchone()
+        )
+
+    def window(self, conversation):
+        """``(summary, turns)`` to put in the prompt; turns are ``(query, answer)`` oldest first."""
+        summary, recent, _ = self._split(conversation)
+        return summary["summary"], [(row["query"], row["answer"]) for row in recent]
+
+    def overflow(self, conversation):
+        """``(summary, turns, upto_id)`` for turns that no longer fit and still need summarising."""
+        summary, _, older = self._split(conversation)
+        if not older:
+            return summary["summary"], [], summary["upto_id"]
+        return summary["summary"], [(row["query"], row["answer"]) for row in older], older[-1]["id"]
+
+    def save_summary(self, conversation, summary, upto_id):
+        with self._connections.transaction() as conn:
+            conn.execute(
+                "INSERT INTO summaries (conversation, summary, tokens, upto_id) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (conversation) DO UPDATE SET summary = excluded.summary, "
+                "tokens = excluded.tokens, upto_id = excluded.upto_id WHERE excluded.upto_id > summaries.upto_id",
+                (conversation, summary, self.count_tokens(summary), upto_id),
+            )
+            conn.execute("DELETE FROM turns WHERE conversation = ? AND id <= ?", (conversation, upto_id))
+
+    def format(self, conversation):
+        summary, turns = self.window(conversation)
+        formatted_history = f"\nSummary of earlier conversation: {summary}" if summary else ""
+        for q, a in turns:
+            formatted_history += f"\nUser: {q}\nFinBot: {a}"
+        return formatted_history
@@ -0,0 +1,135 @@
+import json
+import os
+import re
+import sqlite3
+
+from langchain_core.documents import Document
+
+from utils.sqlite import SQLiteConnections
+
+DOCSTORE_FILE = "docs.db"
+
+# Keeps identifiers such as FINEMP1000, Q3-2024 or v2.1 as single tokens
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[._-][a-z0-9]+)*")
+
+SCHEMA = (
+    """CREATE TABLE chunks (
+        pos INTEGER PRIMARY KEY,
+        id TEXT NOT NULL UNIQUE,
+        text TEXT NOT NULL,
+        metadata TEXT NOT NULL
+    )""",
+    # Contentless full-text index over pre-tokenized chunk text; rowid is the FAISS position
+    """CREATE VIRTUAL TABLE chunks_fts USING fts5(
+        terms, content='', tokenize="unicode61 tokenchars '._-'"
+    )""",
+)
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+class DocstoreWriter:
+    """Writes chunks to a new ``docs.db`` batch by batch, in FAISS position order.
+
+    Rows go straight to disk inside one transaction, so a store of any size
+    is written without holding its text in memory.
+    """
+
+    def __init__(self, folder):
+        self._conn = sqlite3.connect(os.path.join(folder, DOCSTORE_FILE), isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=OFF")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        for statement in SCHEMA:
+            self._conn.execute(statement)
+        self._conn.execute("BEGIN")
+        self._pos = 0
+
+    def add(self, chunk_ids, docs):
+        positions = range(self._pos, self._pos + len(chunk_ids))
+        self._conn.executemany(
+            "INSERT INTO chunks (pos, id, text, metadata) VALUES (?, ?, ?, ?)",
+            ((pos, chunk_id, doc.page_content, json.dumps(doc.metadata))
+             for pos, chunk_id, doc in zip(positions, chunk_ids, docs)),
+        )
+        self._conn.executemany(
+            "INSERT INTO chunks_fts (rowid, terms) VALUES (?, ?)",
+            ((pos, " ".join(tokenize(doc.page_content))) for pos, doc in zip(positions, docs)),
+        )
+        self._pos += len(chunk_ids)
+
+    def close(self):
+        try:
+            self._conn.execute("COMMIT")
+        finally:
+            self._conn.close()
+
+
+def _document(row):
+    return Document(page_content=row["text"], metadata=json.loads(row["metadata"]))
+
+
+class ChunkStore:
+    """Read-only chunk text, metadata and BM25 lexical search from a saved ``docs.db``.
+
+    Nothing is loaded up front: rows are read on demand for the hits of each
+    query, so resident memory does not grow with the corpus, and the file is
+    opened immutable so every worker shares the OS page cache.
+    """
+
+    def __init__(self, folder):
+        self._connections = SQLiteConnections(os.path.join(folder, DOCSTORE_FILE), immutable=True)
+
+    def __len__(self):
+        return self._connections.get().execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def ids_at(self, positions):
+        """``{position: chunk_id}`` for FAISS result positions."""
+        if not positions:
+            return {}
+        rows = self._connections.get().execute(
+            f"SELECT pos, id FROM chunks WHERE pos IN ({','.join('?' * len(positions))})", positions
+        ).fetchall()
+        return {row["pos"]: row["id"] for row in rows}
+
+    def positions_of(self, chunk_ids):
+        """FAISS positions of the ``chunk_ids`` that exist."""
+        chunk_ids = list(chunk_ids)
+        positions = []
+        conn = self._connections.get()
+        # Stay well below SQLite's bound-parameter limit
+        for start in range(0, len(chunk_ids), 500):
+            batch = chunk_ids[start:start + 500]
+            positions.extend(row["pos"] for row in conn.execute(
+                f"SELECT pos FROM chunks WHERE id IN ({','.join('?' * len(batch))})", batch
+            ))
+        return sorted(positions)
+
+    def get(self, chunk_ids):
+        """``{chunk_id: Document}`` for the ``chunk_ids`` that exist."""
+        if not chunk_ids:
+            return {}
+        rows = self._connections.get().execute(
+            f"SELECT id, text, metadata FROM chunks WHERE id IN ({','.join('?' * len(chunk_ids))})", chunk_ids
+        ).fetchall()
+        return {row["id"]: _document(row) for row in rows}
+
+    def search(self, query, k=10, exclude=frozenset()):
+        """Best-first ``(chunk_id, score)`` pairs by Okapi BM25 (higher is better), skipping ``exclude`` ids."""
+        terms = sorted(set(tokenize(query)))
+        if not terms:
+            return []
+        rows = self._connections.get().execute(
+            "SELECT chunks.id AS id, chunks_fts.rank AS rank FROM chunks_fts "
+            "JOIN chunks ON chunks.pos = chunks_fts.rowid "
+            "WHERE chunks_fts MATCH ? ORDER BY chunks_fts.rank LIMIT ?",
+            (" OR ".join(f'"{term}"' for term in terms), k + len(exclude)),
+        ).fetchall()
+        # FTS5 ranks are negated BM25 scores
+        return [(row["id"], -row["rank"]) for row in rows if row["id"] not in exclude][:k]
+
+    def iter_documents(self):
+        """``(chunk_id, Document)`` pairs in FAISS position order, for rebuilding a store."""
+        for row in self._connections.get().execute("SELECT id, text, metadata FROM chunks ORDER BY pos"):
+            yield row["id"], _document(row)
@@ -0,0 +1,156 @@
+import os
+import re
+
+import numpy as np
+from filelock import FileLock
+from langchain_core.embeddings import Embeddings
+
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+ONNX_FILE = "model.onnx"
+ONNX_INT8_FILE = "model.int8.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+
+
+def create_embeddings(backend, model_name, onnx_dir="./onnx_models", threads=None, batch_size=32):
+    """Embedding model for ``backend``: PyTorch sentence-transformers or the ONNX Runtime export."""
+    if backend == "torch":
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(model_name=model_name)
+    if backend in ("onnx", "onnx-int8"):
+        return OnnxEmbeddings(
+            model_name, onnx_dir,
+            quantize=backend == "onnx-int8",
+            threads=threads,
+            batch_size=batch_size,
+        )
+    raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}' (expected one of {', '.join(EMBEDDING_BACKENDS)})")
+
+
+def embedding_model_id(backend, model_name):
+    """Name vectors are cached and indexed under; backends that don't reproduce PyTorch exactly get their own."""
+    return model_name if backend == "torch" else f"{model_name}@{backend}"
+
+
+def export_onnx(model_name, output_dir):
+    """Export the transformer of a sentence-transformers model to ONNX, with its tokenizer.
+
+    Only the encoder is exported; pooling and normalisation run in numpy.
+    Needs torch and transformers, which the PyTorch backend already requires.
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    sample = tokenizer(["FinBot export sample"], return_tensors="pt", padding="max_length", max_length=16)
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    print(f"📦 Exporting {model_name} to ONNX: {output_dir}")
+    fp32_path = os.path.join(output_dir, ONNX_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=17,
+            dynamo=False,
+        )
+    tokenizer.backend_tokenizer.save(os.path.join(output_dir, TOKENIZER_FILE))
+
+
+def quantize_onnx(model_dir):
+    """Dynamic int8 quantization of the exported weights (activations stay float)."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    print("📦 Quantizing ONNX weights to int8")
+    quantize_dynamic(
+        os.path.join(model_dir, ONNX_FILE), os.path.join(model_dir, ONNX_INT8_FILE), weight_type=QuantType.QInt8
+    )
+
+
+def ensure_exported(model_name, onnx_dir, quantize):
+    """Path of the (int8) ONNX model for ``model_name``, exporting it on first use."""
+    model_dir = os.path.join(onnx_dir, re.sub(r"[^A-Za-z0-9_.-]+", "__", model_name))
+    os.makedirs(onnx_dir, exist_ok=True)
+    # Build workers may start at the same time; only one of them exports
+    with FileLock(model_dir + ".lock"):
+        if not all(os.path.exists(os.path.join(model_dir, f)) for f in (ONNX_FILE, TOKENIZER_FILE)):
+            export_onnx(model_name, model_dir)
+        if quantize and not os.path.exists(os.path.join(model_dir, ONNX_INT8_FILE)):
+            quantize_onnx(model_dir)
+    return os.path.join(model_dir, ONNX_INT8_FILE if quantize else ONNX_FILE)
+
+
+class OnnxEmbeddings(Embeddings):
+    """Sentence embeddings from an exported transformer on ONNX Runtime (mean pooling, L2-normalised).
+
+    Matches the pooling of all-MiniLM-L6-v2 and similar sentence-transformers
+    models; ``scripts/check_embedding_parity.py`` verifies a model against PyTorch.
+    """
+
+    def __init__(self, model_name, onnx_dir="./onnx_models", quantize=True, threads=None,
+                 batch_size=32, max_length=256):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        path = ensure_exported(model_name, onnx_dir, quantize)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = Tokenizer.from_file(os.path.join(os.path.dirname(path), TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+        self.model_name = model_name
+        self.batch_size = batch_size
+
+    def _embed_batch(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feed = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": mask,
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        hidden = self.session.run(None, {k: v for k, v in feed.items() if k in self.input_names})[0]
+        weights = mask[..., None].astype(np.float32)
+        pooled = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed(self, texts):
+        """``(len(texts), dim)`` float32 array; texts are batched by length to keep padding small."""
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            for i, vector in zip(batch, self._embed_batch([texts[i] for i in batch])):
+                vectors[i] = vector
+        return np.asarray(vectors, dtype=np.float32)
+
+    def embed_documents(self, texts):
+        return self.embed(list(texts)).tolist() if texts else []
+
+    def embed_query(self, text):
+        return self.embed([text])[0].tolist()
+
+
+def embedding_parity(candidate, reference, texts):
+    """Cosine similarity and max abs difference between two models' vectors for ``texts``."""
+    a = np.asarray(candidate.embed_documents(texts), dtype=np.float32)
+    b = np.asarray(reference.embed_documents(texts), dtype=np.float32)
+    cosine = (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+    return {
+        "texts": len(texts),
+        "min_cosine": float(cosine.min()),
+        "mean_cosine": float(cosine.mean()),
+        "max_abs_diff": float(np.abs(a - b).max()),
+    }
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import re
+import threading
+
+import numpy as np
+from filelock import FileLock
+from langchain_core.embeddings import Embeddings
+
+VECTORS_FILE = "vectors.f32"
+INDEX_FILE = "index.tsv"
+META_FILE = "meta.json"
+
+
+def _text_key(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Append-only on-disk store of embeddings keyed by (model name, text hash).
+
+    Vectors live in one raw float32 file read through ``np.memmap``; ``index.tsv``
+    maps each text hash to its row. Writers append under a file lock, so several
+    processes can share one cache directory.
+    """
+
+    def __init__(self, cache_dir, model_name):
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "__", model_name)
+        self.path = os.path.join(cache_dir, slug)
+        os.makedirs(self.path, exist_ok=True)
+        self.model_name = model_name
+        self._vectors_path = os.path.join(self.path, VECTORS_FILE)
+        self._index_path = os.path.join(self.path, INDEX_FILE)
+        self._meta_path = os.path.join(self.path, META_FILE)
+        self._file_lock = FileLock(os.path.join(self.path, ".lock"))
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._index_offset = 0
+        self._dim = None
+        self._mmap = None
+
+    def __len__(self):
+        with self._lock:
+            self._refresh_locked()
+            return len(self._rows)
+
+    def _refresh_locked(self):
+        # Pick up rows appended by other processes since the last read
+        if self._dim is None and os.path.exists(self._meta_path):
+            with open(self._meta_path, "r", encoding="utf-8") as f:
+                self._dim = json.load(f)["dim"]
+        if not os.path.exists(self._index_path):
+            return
+        if os.path.getsize(self._index_path) == self._index_offset:
+            return
+        with open(self._index_path, "r", encoding="utf-8") as f:
+            f.seek(self._index_offset)
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # partially written line; re-read next time
+                key, row = line.rstrip("\n").split("\t")
+                self._rows[key] = int(row)
+                self._index_offset += len(line.encode("utf-8"))
+        self._mmap = None
+
+    def _vectors_locked(self):
+        if self._mmap is None and self._rows:
+            nrows = os.path.getsize(self._vectors_path) // (self._dim * 4)
+            self._mmap = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(nrows, self._dim))
+        return self._mmap
+
+    def get_many(self, keys):
+        """Return ``{key: vector}`` for the keys that are cached."""
+        with self._lock:
+            self._refresh_locked()
+            found = {k: self._rows[k] for k in keys if k in self._rows}
+            if not found:
+                return {}
+            vectors = self._vectors_locked()
+            return {k: np.array(vectors[row]) for k, row in found.items()}
+
+    def put_many(self, keys, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(keys):
+            return
+        with self._lock, self._file_lock:
+            self._refresh_locked()
+            if self._dim is None:
+                self._dim = int(vectors.shape[1])
+                with open(self._meta_path, "w", encoding="utf-8") as f:
+                    json.dump({"model_name": self.model_name, "dim": self._dim}, f)
+            elif vectors.shape[1] != self._dim:
+                raise ValueError(f"Embedding dim {vectors.shape[1]} does not match cache dim {self._dim}")
+
+            fresh = [(k, v) for k, v in zip(keys, vectors) if k not in self._rows]
+            if not fresh:
+                return
+            row_bytes = self._dim * 4
+            size = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+            start_row = size // row_bytes
+            with open(self._vectors_path, "ab") as f:
+                # Drop any torn tail left by a writer that died mid-append
+                f.truncate(start_row * row_bytes)
+                f.write(np.stack([v for _, v in fresh]).tobytes())
+            lines = "".join(f"{k}\t{start_row + i}\n" for i, (k, _) in enumerate(fresh))
+            with open(self._index_path, "a", encoding="utf-8") as f:
+                f.write(lines)
+            self._refresh_locked()
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that serves document vectors from an :class:`EmbeddingCache` first."""
+
+    def __init__(self, base, cache):
+        self.base = base
+        self.cache = cache
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts):
+        keys = [_text_key(t) for t in texts]
+        cached = self.cache.get_many(set(keys))
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            new_vectors = self.base.embed_documents(list(missing.values()))
+            self.cache.put_many(list(missing.keys()), new_vectors)
+            cached.update(zip(missing.keys(), (np.asarray(v, dtype=np.float32) for v in new_vectors)))
+        return [cached[k].tolist() for k in keys]
+
+    def embed_query(self, text):
+        return self.base.embed_query(text)
+
+
+class LazyEmbeddings(Embeddings):
+    """Defers creating the wrapped model until something actually needs embedding."""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        with self._lock:
+            if self._model is None:
+                self._model = self._factory()
+            return self._model
+
+    def load(self):
+        """Create the model now instead of on first use."""
+        return self.model
+
+    def embed_documents(self, texts):
+        return self.model.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.model.embed_query(text)
@@ -0,0 +1,464 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import chain, islice
+
+import numpy as np
+
+from langchain_community.document_loaders import TextLoader, CSVLoader
+from langchain_core.documents import Document
+
+from services.ann import (
+    FlatIndexWriter,
+    build_serving_index,
+    exact_index_file,
+    index_spec as make_index_spec,
+    load_exact_index,
+    load_serving_index,
+)
+from services.docstore import ChunkStore, DocstoreWriter
+from services.embedding_cache import CachedEmbeddings, EmbeddingCache, LazyEmbeddings
+from services.chunking import FENCE_RE, HEADING_RE
+from services.tombstones import TOMBSTONE_FILE
+
+MANIFEST_FILE = "manifest.json"
+CURRENT_FILE = "CURRENT"
+# 2: role stores carry a BM25 index next to the FAISS one
+# 3: chunks and the BM25 index live in docs.db (SQLite) instead of pickle / JSON
+MANIFEST_VERSION = 3
+SUPPORTED_EXTENSIONS = (".md", ".csv", ".txt", ".pdf")
+# Files larger than this are loaded and chunked a piece at a time as the build consumes them;
+# .md / .txt files are cut into pieces of about this size, at a heading or paragraph break
+STREAM_FILE_BYTES = 8 * 1024 * 1024
+
+# A published role store for serving: memory-mapped FAISS index, the on-disk chunk store
+# (text, metadata and BM25 over the same positions), the per-query FAISS parameters
+# (nprobe / efSearch, and a selector skipping deleted positions) and the deleted chunk ids
+RoleIndex = namedtuple("RoleIndex", ["index", "chunks", "search_params", "deleted"], defaults=(None, frozenset()))
+
+
+def load_role_index(folder):
+    return RoleIndex(load_serving_index(folder), ChunkStore(folder))
+
+
+def write_role_store(folder, batches, index_spec):
+    """Stream ``(chunk_ids, docs, vectors)`` batches into a new role store; returns its chunk count.
+
+    Chunk text goes to ``docs.db`` and vectors to the exact index file as
+    each batch arrives, so neither is held in memory. For an approximate
+    ``index_spec`` the serving index is then built from that file.
+    """
+    os.makedirs(folder, exist_ok=True)
+    writer = DocstoreWriter(folder)
+    vector_writer = FlatIndexWriter(os.path.join(folder, exact_index_file(index_spec)))
+    try:
+        for chunk_ids, docs, vectors in batches:
+            vector_writer.add(vectors)
+            writer.add(chunk_ids, docs)
+    finally:
+        writer.close()
+        ntotal = vector_writer.close()
+    if ntotal and index_spec["type"] != "flat":
+        build_serving_index(folder, index_spec)
+    return ntotal
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def load_manifest(role_vec_path):
+    path = os.path.join(role_vec_path, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(role_vec_path, manifest):
+    path = os.path.join(role_vec_path, MANIFEST_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def current_version(role_dir):
+    """Name of the published version of a role store, or None if nothing is published."""
+    try:
+        with open(os.path.join(role_dir, CURRENT_FILE), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def current_version_path(role_dir):
+    version = current_version(role_dir)
+    return os.path.join(role_dir, version) if version else None
+
+
+def new_version_name():
+    return f"v{time.time_ns()}"
+
+
+def publish_version(role_dir, version):
+    """Atomically point ``CURRENT`` at a fully written version directory."""
+    path = os.path.join(role_dir, CURRENT_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def prune_versions(role_dir, keep):
+    """Remove everything under ``role_dir`` except ``CURRENT``, tombstones and the ``keep`` version names."""
+    for entry in os.listdir(role_dir):
+        if entry in (CURRENT_FILE, TOMBSTONE_FILE, TOMBSTONE_FILE + ".lock") or entry in keep:
+            continue
+        path = os.path.join(role_dir, entry)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            os.remove(path)
+
+
+def count_rows(fpath):
+    with open(fpath, "rb") as f:
+        return max(0, sum(1 for _ in f) - 1)
+
+
+def is_table_only(fpath, max_table_rows):
+    """Whether a CSV is too big to embed row by row; it is only queried through the table engine."""
+    return fpath.endswith(".csv") and max_table_rows is not None and count_rows(fpath) > max_table_rows
+
+
+def pdf_pages(fpath):
+    from PyPDF2 import PdfReader
+
+    for page, pdf_page in enumerate(PdfReader(fpath).pages, start=1):
+        text = (pdf_page.extract_text() or "").strip()
+        if text:
+            yield Document(page_content=text, metadata={"source": fpath, "page": page})
+
+
+def text_pieces(fpath, piece_bytes=STREAM_FILE_BYTES):
+    """The text of a large file in pieces of about ``piece_bytes``.
+
+    A piece ends before a heading or after a blank line once it is big
+    enough, never inside a fenced code block, and unconditionally at four
+    times the size. Chunks never span two pieces, and markdown sections in
+    later pieces lose the headings above the cut from their path.
+    """
+    lines, size, in_fence = [], 0, False
+    with open(fpath, "r", encoding="utf-8") as f:
+        for line in f:
+            at_break = not in_fence and (HEADING_RE.match(line) or (lines and not lines[-1].strip()))
+            if lines and ((size >= piece_bytes and at_break) or size >= 4 * piece_bytes):
+                yield "".join(lines)
+                lines, size = [], 0
+            if FENCE_RE.match(line):
+                in_fence = not in_fence
+            lines.append(line)
+            size += len(line)
+    if lines:
+        yield "".join(lines)
+
+
+def iter_documents(fpath, max_table_rows=None):
+    """Load one source file into LangChain documents (one per .md/.txt file, .csv row or .pdf page), lazily.
+
+    .md/.txt files over ``STREAM_FILE_BYTES`` yield one document per piece of
+    text. CSVs with more than ``max_table_rows`` rows are left out of the
+    vector store entirely; they are only queried through the columnar table engine.
+    """
+    if fpath.endswith((".md", ".txt")):
+        if os.path.getsize(fpath) <= STREAM_FILE_BYTES:
+            yield from TextLoader(fpath, encoding="utf-8").load()
+            return
+        for text in text_pieces(fpath, STREAM_FILE_BYTES):
+            yield Document(page_content=text, metadata={"source": fpath})
+    elif fpath.endswith(".pdf"):
+        yield from pdf_pages(fpath)
+    elif fpath.endswith(".csv"):
+        if is_table_only(fpath, max_table_rows):
+            print(f"📊 Not embedding rows of large table {fpath}")
+            return
+        yield from CSVLoader(file_path=fpath).lazy_load()
+
+
+def list_source_files(role_path):
+    return sorted(f for f in os.listdir(role_path) if f.endswith(SUPPORTED_EXTENSIONS))
+
+
+def iter_chunks(fname, fpath, splitter, max_table_rows=None):
+    """Split a file into chunks and give every chunk a stable, content-derived id.
+
+    The id depends on the file name, the chunk text and how many identical
+    chunks precede it in the same file, so unchanged text keeps its id across
+    edits elsewhere in the file. Yields one ``[(chunk, entry)]`` list per
+    source document, reading the file only as far as it has been consumed.
+    """
+    seen = {}
+    for doc in iter_documents(fpath, max_table_rows):
+        pairs = []
+        for chunk in splitter.split_documents([doc]):
+            chash = text_hash(chunk.page_content)
+            occurrence = seen.get(chash, 0)
+            seen[chash] = occurrence + 1
+            pairs.append((chunk, {"hash": chash, "id": text_hash(f"{fname}\0{chash}\0{occurrence}")}))
+        yield pairs
+
+
+def chunk_file(fname, fpath, splitter, max_table_rows=None):
+    """All chunks of a file at once (see :func:`iter_chunks`); returns ``(chunks, entries, n_docs)``."""
+    chunks, entries, n_docs = [], [], 0
+    for pairs in iter_chunks(fname, fpath, splitter, max_table_rows):
+        n_docs += 1
+        for chunk, entry in pairs:
+            chunks.append(chunk)
+            entries.append(entry)
+    return chunks, entries, n_docs
+
+
+def _scan_file(fname, fpath, previous, splitter, max_table_rows):
+    fhash = file_hash(fpath)
+    if previous is not None and previous["hash"] == fhash:
+        return fhash, None
+    loaded = iter_chunks(fname, fpath, splitter, max_table_rows)
+    # Large files are chunked by the consumer as it goes instead of being loaded whole here
+    return fhash, loaded if os.path.getsize(fpath) > STREAM_FILE_BYTES else list(loaded)
+
+
+def index_signature(embedding_model_name, chunk_size, chunk_overlap, max_table_rows=None, min_chunk_size=None):
+    """Settings baked into stored vectors; a change forces a from-scratch rebuild."""
+    return {
+        "manifest_version": MANIFEST_VERSION,
+        "embedding_model": embedding_model_name,
+        "chunking": "markdown-tokens",
+        "chunk_size": chunk_size,
+        "chunk_overlap": chunk_overlap,
+        "min_chunk_size": min_chunk_size,
+        "max_table_rows": max_table_rows,
+    }
+
+
+def role_needs_sync(role_path, current_path, signature, index_spec=None):
+    """Cheap pre-check (hashes only, no parsing) of whether a role store is stale."""
+    manifest = load_manifest(current_path) if current_path else None
+    if manifest is None or manifest.get("signature") != signature:
+        return True
+    if manifest.get("index", make_index_spec()) != (index_spec or make_index_spec()):
+        return True
+    fnames = list_source_files(role_path)
+    if set(fnames) != set(manifest["files"]):
+        return True
+    return any(file_hash(os.path.join(role_path, f)) != manifest["files"][f]["hash"] for f in fnames)
+
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _scan_files(pool, role_path, fnames, old_files, splitter, max_table_rows, window):
+    """``(fname, result or exception)`` in file order, with at most ``window`` files loaded ahead.
+
+    Loading only runs ahead of what the embedder has consumed by ``window``
+    files, so a slow embedder holds back the loaders instead of letting
+    chunks pile up in memory.
+    """
+    pending = deque()
+    fnames = iter(fnames)
+    while True:
+        for fname in islice(fnames, window - len(pending)):
+            pending.append((fname, pool.submit(
+                _scan_file, fname, os.path.join(role_path, fname), old_files.get(fname), splitter, max_table_rows,
+            )))
+        if not pending:
+            return
+        fname, future = pending.popleft()
+        try:
+            yield fname, future.result()
+        except Exception as e:
+            yield fname, e
+
+
+def _embedded_batches(chunks, embeddings, batch_size, progress):
+    """``(chunk_id, Document)`` pairs -> ``(chunk_ids, docs, vectors)`` batches of ``batch_size``."""
+    embedded = 0
+    for batch in _batched(chunks, batch_size):
+        chunk_ids, docs = zip(*batch)
+        vectors = np.asarray(embeddings.embed_documents([doc.page_content for doc in docs]), dtype=np.float32)
+        embedded += len(batch)
+        progress(chunks_embedded=embedded)
+        yield list(chunk_ids), list(docs), vectors
+
+
+def _stored_batches(folder, deleted_ids, batch_size):
+    """Batches of a saved store's chunks, minus ``deleted_ids``, with their stored vectors."""
+    index = load_exact_index(folder, mmap=True) or load_serving_index(folder)
+    for batch in _batched(enumerate(ChunkStore(folder).iter_documents()), batch_size):
+        kept = [(pos, chunk_id, doc) for pos, (chunk_id, doc) in batch if chunk_id not in deleted_ids]
+        if kept:
+            positions, chunk_ids, docs = zip(*kept)
+            yield list(chunk_ids), list(docs), index.reconstruct_batch(np.array(positions, dtype=np.int64))
+
+
+def sync_role_index(role, role_path, current_path, output_path, embeddings, splitter, signature,
+                    batch_size=64, load_workers=4, progress=None, index_spec=None):
+    """Diff the files under ``role_path`` against the store at ``current_path``.
+
+    The new store is written to ``output_path`` (never to ``current_path``)
+    so it can be published atomically, by a pipeline of generators: files
+    are hashed, loaded and chunked on ``load_workers`` threads, chunks that
+    are new or changed are embedded ``batch_size`` at a time, and each batch
+    is written out before the next is pulled. Files over ``STREAM_FILE_BYTES``
+    are read and chunked piece by piece. Chunks of the previous store that
+    still exist are then copied over with their stored vectors. Memory
+    therefore stays flat in the size of the corpus and of any one file.
+    Returns a summary dict whose ``changed`` flag says whether
+    ``output_path`` was kept.
+
+    Updates are always applied to the exact (flat) vectors, written to disk
+    as they arrive; for an approximate ``index_spec`` the serving index is
+    then rebuilt from them (an HNSW graph does hold all its vectors).
+    """
+    progress = progress or (lambda **fields: None)
+    started = time.time()
+    index_spec = index_spec or make_index_spec()
+    manifest = load_manifest(current_path) if current_path else None
+    reuse = manifest is not None and manifest.get("signature") == signature
+    if not reuse:
+        if manifest is not None:
+            print(f"🧹 Index settings changed for role '{role}', rebuilding from scratch")
+        manifest = {"signature": signature, "files": {}}
+
+    old_files = manifest["files"]
+    new_files = {}
+    deleted_ids = set()
+    summary = {"files_unchanged": 0, "files_changed": [], "files_removed": [], "errors": {}, "docs": 0, "added": 0}
+
+    fnames = list_source_files(role_path)
+    progress(files_total=len(fnames))
+
+    def new_chunks(pool):
+        """Chunks the current store lacks, file by file, recording the diff as it goes."""
+        scanned = _scan_files(
+            pool, role_path, fnames, old_files, splitter, signature.get("max_table_rows"), max(1, load_workers),
+        )
+        for n, (fname, result) in enumerate(scanned, start=1):
+            progress(files_loaded=n)
+            previous = old_files.get(fname)
+            if isinstance(result, Exception):
+                print(f"❌ Skipping {fname}: {result}")
+                summary["errors"][fname] = str(result)
+                # Keep serving the previous vectors of a file we could not read
+                if previous is not None:
+                    new_files[fname] = previous
+                continue
+            fhash, loaded = result
+            if loaded is None:
+                new_files[fname] = previous
+                summary["files_unchanged"] += 1
+                continue
+
+            old_ids = {c["id"] for c in previous["chunks"]} if previous else set()
+            entries = []
+            added = 0
+            # A streamed file that fails part-way fails the build, since its first chunks are already written
+            for pairs in loaded:
+                summary["docs"] += 1
+                new = [(entry["id"], chunk) for chunk, entry in pairs if entry["id"] not in old_ids]
+                entries.extend(entry for _, entry in pairs)
+                added += len(new)
+                summary["added"] += len(new)
+                progress(chunks_total=summary["added"])
+                yield from new
+            removed = old_ids - {entry["id"] for entry in entries}
+            deleted_ids.update(removed)
+            new_files[fname] = {"hash": fhash, "chunks": entries}
+            summary["files_changed"].append(fname)
+            print(f"📄 {fname}: {len(entries)} chunks, {added} new, {len(removed)} removed")
+
+        for fname, previous in old_files.items():
+            if fname not in new_files:
+                deleted_ids.update(c["id"] for c in previous["chunks"])
+                summary["files_removed"].append(fname)
+
+    with ThreadPoolExecutor(max_workers=max(1, load_workers), thread_name_prefix=f"load-{role}") as pool:
+        batches = _embedded_batches(new_chunks(pool), embeddings, batch_size, progress)
+        if reuse:
+            # Lazy: only starts once new_chunks is exhausted, when deleted_ids is complete
+            batches = chain(batches, _stored_batches(current_path, deleted_ids, batch_size))
+        summary["chunks"] = write_role_store(output_path, batches, index_spec)
+
+    summary["deleted"] = len(deleted_ids)
+    spec_changed = manifest.get("index", make_index_spec()) != index_spec
+    summary["changed"] = summary["chunks"] > 0 and (
+        bool(summary["added"] or deleted_ids) or not reuse or spec_changed
+    )
+    if summary["changed"]:
+        manifest["files"] = new_files
+        manifest["index"] = index_spec
+        save_manifest(output_path, manifest)
+    else:
+        shutil.rmtree(output_path, ignore_errors=True)
+
+    elapsed = max(time.time() - started, 1e-6)
+    summary["elapsed_sec"] = round(elapsed, 2)
+    summary["docs_per_sec"] = round(summary["docs"] / elapsed, 1)
+    summary["chunks_per_sec"] = round(summary["added"] / elapsed, 1)
+    return summary
+
+
+# --- Process-pool workers: each builds whole roles with its own embedding model ---
+
+_worker_embeddings = None
+_worker_progress = None
+
+
+def init_build_worker(embeddings_factory, cache_dir, model_name, torch_threads, progress_queue):
+    global _worker_embeddings, _worker_progress
+    try:
+        import torch
+        torch.set_num_threads(torch_threads)
+    except ImportError:
+        pass
+    # The model is only loaded if some chunk misses the shared embedding cache
+    factory = partial(embeddings_factory, threads=torch_threads)
+    _worker_embeddings = CachedEmbeddings(LazyEmbeddings(factory), EmbeddingCache(cache_dir, model_name))
+    _worker_progress = progress_queue
+
+
+def build_role_in_worker(role, role_path, current_path, output_path, splitter, signature, batch_size, load_workers,
+                         index_spec=None):
+    # Reported from here, so a role waiting for a free worker isn't timed as running
+    _worker_progress.put((role, {"status": "running", "started_at": time.time()}))
+    hits, misses = _worker_embeddings.hits, _worker_embeddings.misses
+    summary = sync_role_index(
+        role, role_path, current_path, output_path, _worker_embeddings, splitter, signature,
+        batch_size=batch_size,
+        load_workers=load_workers,
+        progress=lambda **fields: _worker_progress.put((role, fields)),
+        index_spec=index_spec,
+    )
+    # The parent's embedding cache counters never see this process's lookups
+    summary["cache_hits"] = _worker_embeddings.hits - hits
+    summary["cache_misses"] = _worker_embeddings.misses - misses
+    return summary
@@ -0,0 +1,144 @@
+import math
+import threading
+from collections import Counter
+
+import faiss
+import numpy as np
+
+from services.docstore import tokenize
+from services.indexing import RoleIndex
+
+
+class LiveChunks:
+    """In-memory chunk text and BM25 search for a live segment, with the interface of ``ChunkStore``."""
+
+    def __init__(self, chunk_ids, docs, k1=1.2, b=0.75):
+        self._ids = list(chunk_ids)
+        self._docs = dict(zip(self._ids, docs))
+        self._k1 = k1
+        self._b = b
+        self._postings = {}  # term -> {chunk_id: term frequency}
+        self._doc_len = {}
+        for chunk_id, doc in zip(self._ids, docs):
+            tokens = tokenize(doc.page_content)
+            self._doc_len[chunk_id] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                self._postings.setdefault(term, {})[chunk_id] = tf
+        self._avg_len = sum(self._doc_len.values()) / max(1, len(self._ids))
+
+    def __len__(self):
+        return len(self._ids)
+
+    def ids_at(self, positions):
+        return {pos: self._ids[pos] for pos in positions if 0 <= pos < len(self._ids)}
+
+    def get(self, chunk_ids):
+        return {chunk_id: self._docs[chunk_id] for chunk_id in chunk_ids if chunk_id in self._docs}
+
+    def search(self, query, k=10):
+        """Best-first ``(chunk_id, score)`` pairs by Okapi BM25, scored like the FTS5 ``rank`` of a saved store."""
+        n_docs = len(self._ids)
+        scores = {}
+        for term in set(tokenize(query)):
+            docs = self._postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for chunk_id, tf in docs.items():
+                norm = tf + self._k1 * (1 - self._b + self._b * self._doc_len[chunk_id] / max(self._avg_len, 1e-9))
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self._k1 + 1) / norm
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def iter_documents(self):
+        for chunk_id in self._ids:
+            yield chunk_id, self._docs[chunk_id]
+
+
+class LiveIndex:
+    """Uploaded chunks that are searchable before a build folds them into the published store.
+
+    Each collection has a small segment of ``(file name, file hash)`` groups
+    of chunks and their vectors. Every change swaps in a fresh, immutable
+    ``RoleIndex`` (flat FAISS index plus :class:`LiveChunks`), so searches
+    never see a half-applied update and need no lock. Once a published
+    version contains a file with the same hash, :meth:`drop_published`
+    removes it here. Segments live in this process only.
+    """
+
+    def __init__(self):
+        self._files = {}     # collection -> {fname: (fhash, chunk_ids, docs, vectors)}
+        self._segments = {}  # collection -> (RoleIndex, generation)
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def _rebuild_locked(self, collection):
+        files = self._files.get(collection)
+        if not files:
+            self._files.pop(collection, None)
+            self._segments.pop(collection, None)
+            return
+        chunk_ids, docs, vectors = [], [], []
+        for _, file_ids, file_docs, file_vectors in files.values():
+            chunk_ids.extend(file_ids)
+            docs.extend(file_docs)
+            vectors.append(file_vectors)
+        vectors = np.vstack(vectors).astype(np.float32)
+        index = faiss.IndexFlatL2(vectors.shape[1])
+        index.add(vectors)
+        self._generation += 1
+        self._segments[collection] = (RoleIndex(index, LiveChunks(chunk_ids, docs)), self._generation)
+
+    def append(self, collection, fname, fhash, chunk_ids, docs, vectors):
+        """Make one file's chunks searchable, replacing any earlier upload of the same file name."""
+        with self._lock:
+            self._files.setdefault(collection, {})[fname] = (fhash, list(chunk_ids), list(docs), vectors)
+            self._rebuild_locked(collection)
+
+    def remove(self, collection, fname):
+        """Stop serving an uploaded file; returns its chunk ids, or None if it was not live."""
+        with self._lock:
+            entry = self._files.get(collection, {}).pop(fname, None)
+            if entry is None:
+                return None
+            self._rebuild_locked(collection)
+            return entry[1]
+
+    def file_hash(self, collection, fname):
+        """Hash of the live copy of a file, or None if it is not live."""
+        with self._lock:
+            entry = self._files.get(collection, {}).get(fname)
+            return entry[0] if entry else None
+
+    def files(self, collection):
+        """``{fname: chunk count}`` of the collection's live uploads."""
+        with self._lock:
+            return {fname: len(entry[1]) for fname, entry in self._files.get(collection, {}).items()}
+
+    def drop_published(self, collection, manifest_files):
+        """Forget files whose current content is now in the published store (``manifest["files"]``)."""
+        with self._lock:
+            files = self._files.get(collection, {})
+            published = [
+                fname for fname, (fhash, *_) in files.items()
+                if manifest_files.get(fname, {}).get("hash") == fhash
+            ]
+            for fname in published:
+                del files[fname]
+            if published:
+                self._rebuild_locked(collection)
+
+    def clear(self, collection):
+        with self._lock:
+            self._files.pop(collection, None)
+            self._segments.pop(collection, None)
+
+    def get(self, collection):
+        """``(RoleIndex, generation)`` of the collection's live segment, or ``(None, None)``."""
+        return self._segments.get(collection, (None, None))
+
+    def stats(self):
+        with self._lock:
+            return {
+                collection: {"files": len(files), "chunks": sum(len(entry[1]) for entry in files.values())}
+                for collection, files in self._files.items()
+            }
@@ -0,0 +1,119 @@
+import asyncio
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class QueryEmbedder:
+    """Embeds chat queries with an exact-match LRU cache and micro-batching.
+
+    Queries that arrive within ``max_wait_ms`` of each other are embedded in a
+    single ``embed_documents`` forward pass of up to ``max_batch_size`` texts on
+    a dedicated thread. This assumes the model embeds queries and documents the
+    same way, which holds for the sentence-transformers models used here.
+    """
+
+    def __init__(self, embeddings, max_batch_size=32, max_wait_ms=5, cache_size=2048):
+        self.embeddings = embeddings
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.batches = 0
+        self.batched_queries = 0
+
+    def _cached(self, text):
+        with self._cache_lock:
+            vector = self._cache.get(text)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._cache.move_to_end(text)
+            self.hits += 1
+            return vector
+
+    def _remember(self, text, vector):
+        with self._cache_lock:
+            self._cache[text] = vector
+            self._cache.move_to_end(text)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def submit(self, text):
+        """Return a Future resolving to the embedding of ``text``."""
+        vector = self._cached(text)
+        if vector is not None:
+            future = Future()
+            future.set_result(vector)
+            return future
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def embed(self, text):
+        return self.submit(text).result()
+
+    async def aembed(self, text):
+        return await asyncio.wrap_future(self.submit(text))
+
+    def _ensure_worker(self):
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="query-embedder", daemon=True)
+                self._thread.start()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            waiting = {}
+            for text, future in batch:
+                waiting.setdefault(text, []).append(future)
+            texts = list(waiting)
+            try:
+                vectors = self.embeddings.embed_documents(texts)
+            except Exception as e:
+                for futures in waiting.values():
+                    for future in futures:
+                        future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.batched_queries += len(batch)
+            for text, vector in zip(texts, vectors):
+                self._remember(text, vector)
+                for future in waiting[text]:
+                    future.set_result(vector)
+
+    def stats(self):
+        with self._cache_lock:
+            return {
+                "cache_entries": len(self._cache),
+                "cache_hits": self.hits,
+                "cache_misses": self.misses,
+                "batches": self.batches,
+                "avg_batch_size": round(self.batched_queries / self.batches, 2) if self.batches else 0.0,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+            }
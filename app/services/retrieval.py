@@ -0,0 +1,92 @@
+import re
+
+import numpy as np
+
+# A bare identifier such as FINEMP1000, Q3 or INV-2024-17: letters and digits, no spaces
+IDENTIFIER_RE = re.compile(r"^(?=[A-Za-z0-9._-]*[A-Za-z])(?=[A-Za-z0-9._-]*\d)[A-Za-z0-9._-]+$")
+
+# Store name suffix of a collection's live segment: chunks not yet folded into its published store
+LIVE_SUFFIX = "+live"
+
+
+def is_identifier_query(query):
+    return bool(IDENTIFIER_RE.match(query.strip().strip("\"'`?.!")))
+
+
+def reciprocal_rank_fusion(rankings, rrf_k=60):
+    """Fuse several best-first lists of ids into one, scoring each id by sum(1 / (rrf_k + rank))."""
+    scores = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (rrf_k + rank)
+    return [chunk_id for chunk_id, _ in sorted(scores.items(), key=lambda item: item[1], reverse=True)]
+
+
+def dense_search(role_index, query_embedding, k):
+    """Best-first ``(chunk_id, distance)`` pairs from the FAISS index for an already-embedded query."""
+    vector = np.asarray([query_embedding], dtype=np.float32)
+    distances, positions = role_index.index.search(vector, k, params=role_index.search_params)
+    hits = [(int(p), float(d)) for d, p in zip(distances[0], positions[0]) if p != -1]
+    ids = role_index.chunks.ids_at([p for p, _ in hits])
+    return [(ids[p], d) for p, d in hits if p in ids]
+
+
+def lexical_search(role_index, query, k):
+    """Best-first ``(chunk_id, score)`` pairs from the chunk store's BM25 index, without deleted chunks."""
+    if role_index.deleted:
+        return role_index.chunks.search(query, k, exclude=role_index.deleted)
+    return role_index.chunks.search(query, k)
+
+
+def search_collection(role_index, query, query_embedding, fetch_k):
+    """Dense and lexical candidates of one collection; dense is skipped without an embedding.
+
+    Deleted chunks are excluded by the FAISS selector in ``search_params``
+    and by the lexical search, so neither spends its ``fetch_k`` on them.
+    """
+    dense = dense_search(role_index, query_embedding, fetch_k) if query_embedding is not None else []
+    return dense, lexical_search(role_index, query, fetch_k)
+
+
+def merge_results(results, k, rrf_k=60):
+    """Top ``k`` ``(collection, chunk_id)`` keys across ``{collection: (dense, lexical)}`` results.
+
+    Every collection is embedded with the same model, so dense hits merge by
+    distance and lexical hits by BM25 score; the two merged rankings are then
+    combined with reciprocal rank fusion. A chunk found in both a collection's
+    published store and its live segment (the unchanged part of a file edited
+    since the last fold) counts once, as the live copy.
+    """
+    live = {
+        (collection, chunk_id)
+        for collection, (dense_hits, lexical_hits) in results.items() if collection.endswith(LIVE_SUFFIX)
+        for chunk_id, _ in [*dense_hits, *lexical_hits]
+    }
+
+    def key(collection, chunk_id):
+        live_key = (collection + LIVE_SUFFIX, chunk_id)
+        return live_key if live_key in live else (collection, chunk_id)
+
+    dense = sorted(
+        ((distance, key(collection, chunk_id)) for collection, (hits, _) in results.items() for chunk_id, distance in hits),
+        key=lambda item: item[0],
+    )
+    lexical = sorted(
+        ((score, key(collection, chunk_id)) for collection, (_, hits) in results.items() for chunk_id, score in hits),
+        key=lambda item: item[0],
+        reverse=True,
+    )
+    rankings = [list(dict.fromkeys(key for _, key in ranking)) for ranking in (dense, lexical) if ranking]
+    return reciprocal_rank_fusion(rankings, rrf_k)[:k]
+
+
+def fetch_documents(indexes, keys):
+    """Documents for ``(collection, chunk_id)`` keys from ``{collection: RoleIndex}``, read lazily per collection."""
+    by_collection = {}
+    for collection, chunk_id in keys:
+        by_collection.setdefault(collection, []).append(chunk_id)
+    docs = {}
+    for collection, chunk_ids in by_collection.items():
+        for chunk_id, doc in indexes[collection].chunks.get(chunk_ids).items():
+            docs[(collection, chunk_id)] = doc
+    return [docs[key] for key in keys if key in docs]
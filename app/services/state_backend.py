@@ -0,0 +1,90 @@
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict
+
+from utils.sqlite import SQLiteConnections
+
+
+class StateBackend(ABC):
+    """Key/value storage for state that every worker must agree on (build jobs).
+
+    Values are JSON-serialisable; keys are grouped by ``namespace``.
+    """
+
+    @abstractmethod
+    def get(self, namespace, key, default=None):
+        ...
+
+    @abstractmethod
+    def set(self, namespace, key, value):
+        ...
+
+    @abstractmethod
+    def delete(self, namespace, key):
+        ...
+
+
+class InMemoryStateBackend(StateBackend):
+    """Process-local backend: fastest, but each uvicorn worker sees its own copy."""
+
+    def __init__(self):
+        self._values = defaultdict(dict)
+        self._lock = threading.Lock()
+
+    def get(self, namespace, key, default=None):
+        with self._lock:
+            return self._values[namespace].get(key, default)
+
+    def set(self, namespace, key, value):
+        with self._lock:
+            self._values[namespace][key] = value
+
+    def delete(self, namespace, key):
+        with self._lock:
+            self._values[namespace].pop(key, None)
+
+
+class SQLiteStateBackend(StateBackend):
+    """Backend in a local SQLite file (WAL mode) shared by all workers on the host."""
+
+    SCHEMA = (
+        """CREATE TABLE IF NOT EXISTS kv (
+            namespace TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT NOT NULL,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (namespace, key)
+        )""",
+    )
+
+    def __init__(self, path):
+        self._connections = SQLiteConnections(path)
+        conn = self._connections.get()
+        for statement in self.SCHEMA:
+            conn.execute(statement)
+
+    def get(self, namespace, key, default=None):
+        row = self._connections.get().execute(
+            "SELECT value FROM kv WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        return json.loads(row["value"]) if row else default
+
+    def set(self, namespace, key, value):
+        self._connections.get().execute(
+            "INSERT INTO kv (namespace, key, value, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at",
+            (namespace, key, json.dumps(value), time.time()),
+        )
+
+    def delete(self, namespace, key):
+        self._connections.get().execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key))
+
+
+def create_state_backend(kind, sqlite_path):
+    if kind == "memory":
+        return InMemoryStateBackend()
+    if kind == "sqlite":
+        return SQLiteStateBackend(sqlite_path)
+    raise ValueError(f"Unknown STATE_BACKEND '{kind}' (expected 'memory' or 'sqlite')")
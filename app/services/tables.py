@@ -0,0 +1,213 @@
+import os
+import re
+import threading
+from collections import namedtuple
+
+import pandas as pd
+
+TABLE_EXTENSIONS = (".csv",)
+
+# Questions about rankings, totals, counts or thresholds are answered from the columns, not from chunks
+ANALYTICAL_RE = re.compile(
+    r"\b(most|least|highest|lowest|top|bottom|average|avg|mean|median|total|sum|count|how many|"
+    r"number of|maximum|minimum|max|min|rank|ranked|sort|sorted|order by|list all|all employees|"
+    r"more than|less than|fewer than|greater than|above|below|between|at least|at most|"
+    r"group by|per department|by department|breakdown|distribution)\b",
+    re.IGNORECASE,
+)
+
+# Parts of table / column names too generic to tie a question to that table
+GENERIC_SCHEMA_WORDS = frozenset({"data", "date", "full", "last", "table"})
+WORD_RE = re.compile(r"[a-z]+")
+
+FILTER_OPS = {
+    "==": lambda col, v: col == v,
+    "!=": lambda col, v: col != v,
+    ">": lambda col, v: col > v,
+    ">=": lambda col, v: col >= v,
+    "<": lambda col, v: col < v,
+    "<=": lambda col, v: col <= v,
+    "in": lambda col, v: col.isin(v if isinstance(v, list) else [v]),
+    "contains": lambda col, v: col.str.contains(str(v), case=False, regex=False),
+}
+AGG_FUNCS = ("count", "sum", "mean", "median", "min", "max", "nunique")
+
+# ``rows`` is at most ``max_rows`` long; ``matched`` counts rows passing the filters, ``total`` result rows
+TableResult = namedtuple("TableResult", ["table", "rows", "matched", "total"])
+
+
+class TableQueryError(ValueError):
+    pass
+
+
+def is_analytical_query(query):
+    return bool(ANALYTICAL_RE.search(query))
+
+
+def _word_stems(text):
+    # Four-letter prefixes: crude, but match "employees" to employee_id or "salaries" to salary
+    return {word[:4] for word in WORD_RE.findall(text.lower()) if len(word) >= 4 and word not in GENERIC_SCHEMA_WORDS}
+
+
+def mentions_tables(query, tables):
+    """Whether the question names one of ``tables`` or one of their columns.
+
+    Analytical wording alone ("total revenue in Q3") is not enough to spend
+    an LLM planning call on a table that has nothing to do with it.
+    """
+    names = " ".join([*tables, *(str(column) for df in tables.values() for column in df.columns)])
+    return bool(_word_stems(query) & _word_stems(names.replace("_", " ")))
+
+
+def load_table(path):
+    """Read a CSV into typed, Arrow-backed columns (numbers, dates and strings stay compact)."""
+    return pd.read_csv(path, engine="pyarrow", dtype_backend="pyarrow")
+
+
+def describe_table(name, df, max_categories=20):
+    """One line per column with its type and either its range or its distinct values."""
+    lines = [f"Table `{name}` ({len(df)} rows):"]
+    for column in df.columns:
+        series = df[column]
+        kind = str(series.dtype).replace("[pyarrow]", "")
+        if pd.api.types.is_numeric_dtype(series) or kind.startswith(("date", "timestamp")):
+            detail = f"min {series.min()}, max {series.max()}"
+        else:
+            values = series.dropna().unique()
+            if len(values) <= max_categories:
+                detail = "values: " + ", ".join(sorted(str(v) for v in values))
+            else:
+                detail = f"{len(values)} distinct, e.g. {values[0]}"
+        lines.append(f"- {column} ({kind}): {detail}")
+    return "\n".join(lines)
+
+
+class TableStore:
+    """Columnar copies of the tabular source files under ``data_dir/<collection>/``.
+
+    Each file is parsed once and kept in memory until it changes on disk, so
+    aggregate questions scan typed columns instead of embedded rows.
+    """
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self._tables = {}  # path -> (mtime, size, DataFrame, description)
+        self._lock = threading.Lock()
+
+    def tables(self, collections):
+        """``({name: DataFrame}, schema)`` for every table in ``collections``, keyed by file stem.
+
+        ``schema`` is the column description the query planner is prompted with.
+        """
+        tables, descriptions = {}, []
+        for collection in collections:
+            collection_path = os.path.join(self.data_dir, collection)
+            if not os.path.isdir(collection_path):
+                continue
+            for fname in sorted(os.listdir(collection_path)):
+                if fname.endswith(TABLE_EXTENSIONS):
+                    name = os.path.splitext(fname)[0]
+                    tables[name], description = self._load(name, os.path.join(collection_path, fname))
+                    descriptions.append(description)
+        return tables, "\n\n".join(descriptions)
+
+    def _load(self, name, path):
+        stat = os.stat(path)
+        with self._lock:
+            cached = self._tables.get(path)
+            if cached is not None and cached[:2] == (stat.st_mtime, stat.st_size):
+                return cached[2:]
+            print(f"📊 Loading table: {path}")
+            df = load_table(path)
+            description = describe_table(name, df)
+            self._tables[path] = (stat.st_mtime, stat.st_size, df, description)
+            return df, description
+
+    def stats(self):
+        with self._lock:
+            frames = [entry[2] for entry in self._tables.values()]
+        return {
+            "tables": len(frames),
+            "rows": sum(len(df) for df in frames),
+            "bytes": sum(int(df.memory_usage(deep=True).sum()) for df in frames),
+        }
+
+
+def _column(df, name):
+    if name not in df.columns:
+        raise TableQueryError(f"Unknown column '{name}'")
+    return df[name]
+
+
+def _coerce(series, value):
+    # Dates arrive from the planner as ISO strings
+    if isinstance(value, str) and str(series.dtype).startswith(("date", "timestamp")):
+        return pd.Timestamp(value)
+    return value
+
+
+def run_table_query(tables, plan, max_rows=50):
+    """Execute a query ``plan`` against ``tables`` and return a :class:`TableResult`.
+
+    The plan is a dict with optional ``filters`` (``[{column, op, value}]``),
+    ``group_by`` (column list), ``aggregations`` (``[{column, func}]``, output
+    columns named ``<func>_<column>``), ``sort`` (``[{column, descending}]``),
+    ``columns`` and ``limit``. Only whitelisted operations run; nothing from
+    the plan is evaluated.
+    """
+    name = plan.get("table") or (next(iter(tables)) if len(tables) == 1 else None)
+    if name not in tables:
+        raise TableQueryError(f"Unknown table '{name}'")
+    df = tables[name]
+
+    for f in plan.get("filters") or []:
+        op = FILTER_OPS.get(f.get("op"))
+        if op is None:
+            raise TableQueryError(f"Unsupported filter operator '{f.get('op')}'")
+        column = _column(df, f.get("column"))
+        df = df[op(column, _coerce(column, f.get("value"))).fillna(False)]
+    matched = len(df)
+
+    group_by = plan.get("group_by") or []
+    aggregations = plan.get("aggregations") or []
+    for column in group_by:
+        _column(df, column)
+    if aggregations:
+        named = {}
+        for agg in aggregations:
+            func = agg.get("func")
+            if func not in AGG_FUNCS:
+                raise TableQueryError(f"Unsupported aggregation '{func}'")
+            column = agg.get("column") or df.columns[0]
+            _column(df, column)
+            named[f"{func}_{column}"] = pd.NamedAgg(column=column, aggfunc=func)
+        if group_by:
+            df = df.groupby(group_by, dropna=False).agg(**named).reset_index()
+        else:
+            df = pd.DataFrame([{key: getattr(df[agg.column], agg.aggfunc)() for key, agg in named.items()}])
+    elif group_by:
+        df = df.groupby(group_by, dropna=False).size().reset_index(name="count")
+
+    sort = plan.get("sort") or []
+    if sort:
+        for s in sort:
+            _column(df, s.get("column"))
+        df = df.sort_values(
+            [s["column"] for s in sort],
+            ascending=[not s.get("descending", False) for s in sort],
+        )
+
+    # Project after sorting so rows can be ordered by a column that isn't shown
+    if not aggregations and not group_by and plan.get("columns"):
+        df = df[[_column(df, c).name for c in plan["columns"]]]
+
+    limit = min(int(plan.get("limit") or max_rows), max_rows)
+    return TableResult(name, df.head(limit), matched, len(df))
+
+
+def format_result(result):
+    """Compact CSV rendering of a query result, used as the LLM's only context."""
+    header = f"Result of a structured query over table `{result.table}` ({result.matched} matching rows"
+    if len(result.rows) < result.total:
+        header += f"; first {len(result.rows)} of {result.total} result rows"
+    return f"{header}):\n{result.rows.to_csv(index=False).strip()}"
@@ -0,0 +1,78 @@
+import json
+import os
+import threading
+
+from filelock import FileLock
+
+TOMBSTONE_FILE = "TOMBSTONES"
+
+
+class Tombstones:
+    """Chunk ids deleted from a collection but possibly still in its published store.
+
+    Kept as a JSON list in ``<vector_dir>/<collection>/TOMBSTONES``, next to
+    ``CURRENT``, so every worker filters the same ids; a worker re-reads the
+    file when its mtime changes. Writes hold a file lock since deletes may
+    arrive at several workers at once. Ids are pruned once a compacted
+    version no longer contains them.
+    """
+
+    def __init__(self, vector_dir):
+        self.vector_dir = vector_dir
+        self._cache = {}  # collection -> (mtime_ns, frozenset of chunk ids)
+        self._lock = threading.Lock()
+
+    def _path(self, collection):
+        return os.path.join(self.vector_dir, collection, TOMBSTONE_FILE)
+
+    def get(self, collection):
+        """``(chunk_ids, stamp)``; the stamp changes whenever the set does (0 when there are none)."""
+        path = self._path(collection)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return frozenset(), 0
+        with self._lock:
+            cached = self._cache.get(collection)
+            if cached is not None and cached[0] == mtime:
+                return cached[1], mtime
+        with open(path, "r", encoding="utf-8") as f:
+            chunk_ids = frozenset(json.load(f))
+        with self._lock:
+            self._cache[collection] = (mtime, chunk_ids)
+        return chunk_ids, mtime
+
+    def _update(self, collection, update):
+        path = self._path(collection)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with FileLock(path + ".lock"):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    chunk_ids = set(json.load(f))
+            except FileNotFoundError:
+                chunk_ids = set()
+            new_ids = update(chunk_ids)
+            if new_ids == chunk_ids:
+                return
+            if not new_ids:
+                os.remove(path)
+                return
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(sorted(new_ids), f)
+            os.replace(tmp_path, path)
+
+    def add(self, collection, chunk_ids):
+        self._update(collection, lambda current: current | set(chunk_ids))
+
+    def discard(self, collection, chunk_ids):
+        """Un-delete ids, e.g. when a deleted document is uploaded again."""
+        if not os.path.exists(self._path(collection)):
+            return
+        self._update(collection, lambda current: current - set(chunk_ids))
+
+    def prune(self, collection, stored_ids):
+        """Keep only tombstones for ids the published store still holds."""
+        if not os.path.exists(self._path(collection)):
+            return
+        self._update(collection, lambda current: current & set(stored_ids))
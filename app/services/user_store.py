@@ -0,0 +1,83 @@
+import json
+import os
+import sqlite3
+from uuid import uuid4
+
+from utils.sqlite import SQLiteConnections
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    username TEXT NOT NULL UNIQUE,
+    password TEXT NOT NULL,
+    role TEXT NOT NULL,
+    logged_in INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+
+class UserExistsError(Exception):
+    pass
+
+
+class UserStore:
+    """SQLite-backed user table, safe to share between threads and uvicorn workers.
+
+    The database runs in WAL mode so logins (reads) never wait on writers, and
+    each thread (and forked worker) keeps its own connection. ``username``
+    carries a unique index, so lookups and duplicate checks don't scan the table.
+    """
+
+    def __init__(self, path, legacy_json_path=None):
+        self.path = path
+        self._connections = SQLiteConnections(path)
+        self._conn().execute(SCHEMA)
+        if legacy_json_path and os.path.exists(legacy_json_path):
+            self._import_json(legacy_json_path)
+
+    def _conn(self):
+        return self._connections.get()
+
+    def _import_json(self, legacy_json_path):
+        """One-time migration of the old users.json file; existing rows are left alone."""
+        if self._conn().execute("SELECT 1 FROM users LIMIT 1").fetchone():
+            return
+        with open(legacy_json_path, "r") as f:
+            users = json.load(f)
+        with self._connections.transaction() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO users (id, username, password, role, logged_in) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (user_id, u["username"], u["password"], u["role"], int(bool(u.get("logged_in", False))))
+                    for user_id, u in users.items()
+                ],
+            )
+        print(f"📦 Imported {len(users)} users from {legacy_json_path}")
+
+    def get_by_username(self, username):
+        row = self._conn().execute(
+            "SELECT id, username, password, role, logged_in FROM users WHERE username = ?", (username,)
+        ).fetchone()
+        if row is None:
+            return None
+        user = dict(row)
+        user["logged_in"] = bool(user["logged_in"])
+        return user
+
+    def create(self, username, password, role):
+        user_id = str(uuid4())
+        try:
+            self._conn().execute(
+                "INSERT INTO users (id, username, password, role) VALUES (?, ?, ?, ?)",
+                (user_id, username, password, role),
+            )
+        except sqlite3.IntegrityError:
+            raise UserExistsError(username)
+        return user_id
+
+    def set_logged_in(self, username, logged_in):
+        """Update one user's login flag; returns False if the user does not exist."""
+        cursor = self._conn().execute(
+            "UPDATE users SET logged_in = ? WHERE username = ?", (int(logged_in), username)
+        )
+        return cursor.rowcount > 0
@@ -0,0 +1,101 @@
+import os
+import threading
+from collections import OrderedDict
+
+
+def directory_size(path):
+    """Total size in bytes of the files under ``path`` (used as the footprint of a saved store)."""
+    total = 0
+    for root, _, files in os.walk(path):
+        for fname in files:
+            try:
+                total += os.path.getsize(os.path.join(root, fname))
+            except OSError:
+                pass
+    return total
+
+
+class RoleIndexCache:
+    """Process-wide LRU cache of loaded role vector stores, bounded by a byte budget.
+
+    ``loader`` callables passed to :meth:`get` return ``(store, nbytes)``; the
+    byte estimate is what counts against ``max_bytes``. Entries larger than the
+    whole budget are served but never kept. Each entry remembers the published
+    version it was loaded from, so a newer version replaces it on next access.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # role -> (store, nbytes, version)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _load_lock(self, role):
+        with self._lock:
+            return self._load_locks.setdefault(role, threading.Lock())
+
+    def get(self, role, loader, version=None):
+        """Return the cached store for ``role``, loading it when missing or not at ``version``."""
+        with self._lock:
+            entry = self._entries.get(role)
+            if entry is not None and entry[2] == version:
+                self._entries.move_to_end(role)
+                self.hits += 1
+                return entry[0]
+
+        # Only one thread loads a given role; the others wait and reuse its result.
+        with self._load_lock(role):
+            with self._lock:
+                entry = self._entries.get(role)
+                if entry is not None and entry[2] == version:
+                    self._entries.move_to_end(role)
+                    self.hits += 1
+                    return entry[0]
+                self.misses += 1
+
+            store, nbytes = loader()
+
+            with self._lock:
+                stale = self._entries.pop(role, None)
+                if stale is not None:
+                    self._total_bytes -= stale[1]
+                if nbytes > self.max_bytes:
+                    print(f"⚠️ Store for '{role}' ({nbytes} bytes) exceeds cache budget, not caching")
+                    return store
+                self._entries[role] = (store, nbytes, version)
+                self._total_bytes += nbytes
+                self._evict_locked()
+            return store
+
+    def _evict_locked(self):
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            role, (_, nbytes, _) = self._entries.popitem(last=False)
+            self._total_bytes -= nbytes
+            self.evictions += 1
+            print(f"♻️ Evicted vector store for role '{role}' from cache")
+
+    def invalidate(self, role=None):
+        """Drop one role (or every role when ``role`` is None) from the cache."""
+        with self._lock:
+            if role is None:
+                self._entries.clear()
+                self._total_bytes = 0
+                return
+            entry = self._entries.pop(role, None)
+            if entry is not None:
+                self._total_bytes -= entry[1]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "roles": list(self._entries.keys()),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,114 @@
+import os
+import threading
+import time
+
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+
+
+class Debouncer:
+    """Collects items and hands them to ``callback`` as one set once none has arrived for ``debounce_sec``.
+
+    A steady stream of items still flushes after ``max_delay_sec``. The
+    callback runs on a timer thread.
+    """
+
+    def __init__(self, callback, debounce_sec, max_delay_sec, label="changes"):
+        self.callback = callback
+        self.debounce_sec = debounce_sec
+        self.max_delay_sec = max_delay_sec
+        self.label = label
+        self._pending = set()
+        self._first_added_at = None
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def add(self, items):
+        if not items:
+            return
+        with self._lock:
+            now = time.time()
+            self._pending |= set(items)
+            if self._first_added_at is None:
+                self._first_added_at = now
+            if self._timer is not None:
+                self._timer.cancel()
+            delay = min(self.debounce_sec, max(0.0, self._first_added_at + self.max_delay_sec - now))
+            self._timer = threading.Timer(delay, self._flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def cancel(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+
+    def _flush(self):
+        with self._lock:
+            items, self._pending = self._pending, set()
+            self._first_added_at = None
+            self._timer = None
+        if not items:
+            return
+        try:
+            self.callback(items)
+        except Exception as e:
+            print(f"❌ Handling {self.label} failed: {e}")
+
+
+class DataDirWatcher(FileSystemEventHandler):
+    """Watches the collection folders under ``data_dir`` and reports which files changed.
+
+    ``on_change`` is called with a set of ``(collection, file name)`` pairs
+    once no event has arrived for ``debounce_sec``, so saving a file several
+    times or copying in a batch of documents is reported once; a steady
+    stream of events still flushes after ``max_delay_sec``. A collection
+    folder that appears or disappears as a whole is reported as
+    ``(collection, None)``. Only files with one of ``extensions`` directly
+    inside a collection folder count, so editor swap and temp files are ignored.
+    """
+
+    def __init__(self, data_dir, on_change, extensions, debounce_sec=2.0, max_delay_sec=30.0):
+        self.data_dir = os.path.abspath(data_dir)
+        self.extensions = tuple(extensions)
+        self._changes = Debouncer(self._report, debounce_sec, max_delay_sec, label="document changes")
+        self._on_change = on_change
+        self._observer = None
+
+    def start(self):
+        self._observer = Observer()
+        self._observer.schedule(self, self.data_dir, recursive=True)
+        self._observer.daemon = True
+        self._observer.start()
+        print(f"👀 Watching {self.data_dir} for document changes")
+
+    def stop(self):
+        self._changes.cancel()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+
+    def _change(self, path, is_directory):
+        parts = os.path.relpath(os.path.abspath(path), self.data_dir).split(os.sep)
+        if parts[0] in (".", ".."):
+            return None
+        if is_directory:
+            return (parts[0], None) if len(parts) == 1 else None
+        if len(parts) == 2 and parts[1].endswith(self.extensions):
+            return parts[0], parts[1]
+        return None
+
+    def on_any_event(self, event):
+        if event.event_type not in ("created", "modified", "deleted", "moved"):
+            return
+        # A folder is "modified" whenever a file in it changes; that file has its own event
+        if event.is_directory and event.event_type == "modified":
+            return
+        paths = [event.src_path, getattr(event, "dest_path", "")]
+        changes = {self._change(os.fsdecode(path), event.is_directory) for path in filter(None, paths)}
+        changes.discard(None)
+        self._changes.add(changes)
+
+    def _report(self, changes):
+        print(f"👀 Documents changed in: {', '.join(sorted({collection for collection, _ in changes}))}")
+        self._on_change(changes)
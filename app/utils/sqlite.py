@@ -0,0 +1,55 @@
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+
+class SQLiteConnections:
+    """Hands out one WAL-mode SQLite connection per thread and per process.
+
+    Connections are never shared across ``fork()``: a child process that
+    inherits this object opens fresh connections on first use. With
+    ``immutable=True`` the file is opened read-only and without locking, for
+    databases that are never written once published.
+    """
+
+    def __init__(self, path, immutable=False):
+        self.path = path
+        self.immutable = immutable
+        self._local = threading.local()
+
+    def get(self):
+        pid = os.getpid()
+        if getattr(self._local, "pid", None) != pid:
+            if self.immutable:
+                conn = sqlite3.connect(
+                    f"{Path(self.path).resolve().as_uri()}?mode=ro&immutable=1",
+                    uri=True, isolation_level=None, check_same_thread=False,
+                )
+            else:
+                conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute("PRAGMA busy_timeout=30000")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+            self._local.pid = pid
+        return self._local.conn
+
+    def transaction(self):
+        return _Transaction(self.get())
+
+
+class _Transaction:
+    """``BEGIN IMMEDIATE`` ... ``COMMIT`` block that rolls back on error."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
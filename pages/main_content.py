@@ -1,7 +1,9 @@
 import streamlit as st
 import streamlit.components.v1 as components
-import os
-import json
+import requests
+
+
+API_URL = "http://localhost:8000"  # Your FastAPI backend
 
 
 def restore_session_state():
@@ -9,20 +11,15 @@ def restore_session_state():
     query_params = st.session_state
     username = query_params.get("username")
     print("user name ---",username)
-    base_dir = os.path.dirname(os.path.abspath(__file__))  # pages/
-    users_file_path = os.path.abspath(os.path.join(base_dir, "..",'app', "users.json"))
-    print(users_file_path)
 
     if username:
         try:
-            with open(users_file_path, "r") as f:
-                users = json.load(f)
-
-            # ✅ Search through values (user objects)
-            user = next((u for u in users.values() if u["username"] == username), None)
+            # Login state lives in the backend's user store
+            res = requests.get(f"{API_URL}/get_user_status", params={"username": username}, timeout=5)
+            user = res.json() if res.status_code == 200 else None
 
             if user and user.get("logged_in"):
-                st.session_state["username"] = user["username"]
+                st.session_state["username"] = username
                 st.session_state["logged_in"] = True
                 st.session_state["role"] = user.get("role")
                 print(f"✅ Session restored for {username}")
@@ -32,7 +29,7 @@ def restore_session_state():
                 st.session_state["role"] = None
 
         except Exception as e:
-            print(f"❌ Error loading users.json: {e}")
+            print(f"❌ Error fetching user status: {e}")
             st.session_state["logged_in"] = False
             st.session_state["role"] = None
     else:
@@ -86,6 +83,7 @@ print("===========",st.session_state)
 logged_in = st.session_state.get("logged_in", False)
 username = st.session_state.get("username", "Guest")
 role = st.session_state.get("role", None)
+token = st.session_state.get("token") or ""
 
 # --- THEN Handle Query Params ---
 query_params = st.query_params
@@ -568,6 +566,42 @@ with col2:
                 chatWindow.classList.toggle("open");
             }}
     
+            // One conversation per browser tab, so history follows this user and session
+            function getSessionId() {{
+                let sessionId = sessionStorage.getItem("finbot_session_id");
+                if (!sessionId) {{
+                    sessionId = crypto.randomUUID();
+                    sessionStorage.setItem("finbot_session_id", sessionId);
+                }}
+                return sessionId;
+            }}
+
+            // The login token says whose history this is; without one only this tab's session is used
+            let tokenExpired = false;
+            function authHeaders() {{
+                const token = "{token}";
+                return token && !tokenExpired ? {{"Authorization": "Bearer " + token}} : {{}};
+            }}
+
+            // Once the login token expires, say so and carry on in this tab's session
+            async function postChat(formData, botMessage) {{
+                const headers = authHeaders();
+                const response = await fetch("http://localhost:8000/rag_chat_stream", {{
+                    method: "POST",
+                    headers: headers,
+                    body: formData
+                }});
+                if (response.status === 401 && headers.Authorization) {{
+                    tokenExpired = true;
+                    const notice = document.createElement("div");
+                    notice.className = "message bot";
+                    notice.innerHTML = "⚠️ Your session has expired. Log out and log in again to get your chat history back; until then this chat continues without it.";
+                    botMessage.before(notice);
+                    return postChat(formData, botMessage);
+                }}
+                return response;
+            }}
+
             function formatBotReply(text) {{
                 return text
                     .replace(/\\n/g, "<br>")
@@ -587,29 +621,70 @@ with col2:
                         const formData = new FormData();
                         formData.append("query", msg);
                         formData.append("role", "{role}");
+                        formData.append("session_id", getSessionId());
     
+                        const botMessage = document.createElement("div");
+                        botMessage.className = "message bot";
+                        botMessage.innerHTML = "<br>…";
+                        chat.appendChild(botMessage);
+
                         try {{
-                            console.log("📤 Sending to /rag_chat");
-                            const response = await fetch("http://localhost:8000/rag_chat", {{
-                                method: "POST",
-                                body: formData
-                            }});
-                            console.log("📥 Raw response:", response);
-    
+                            console.log("📤 Sending to /rag_chat_stream");
+                            const response = await postChat(formData, botMessage);
+
                             if (!response.ok) {{
                                 throw new Error("Server returned error: " + response.status);
                             }}
-    
-                            const data = await response.json();
-                            console.log("✅ Parsed response:", data);
-    
-                            const botReply = data.response || "Sorry, I couldn't find anything relevant.";
-                            chat.innerHTML += `<div class='message bot'><br>${{formatBotReply(botReply)}}</div>`;
+
+                            // Parse Server-Sent Events as they arrive and render tokens incrementally
+                            const reader = response.body.getReader();
+                            const decoder = new TextDecoder();
+                            let buffer = "";
+                            let botReply = "";
+                            let finished = false;
+
+                            while (!finished) {{
+                                const {{ value, done }} = await reader.read();
+                                if (done) break;
+                                buffer += decoder.decode(value, {{ stream: true }});
+
+                                let boundary;
+                                while ((boundary = buffer.indexOf("\\n\\n")) !== -1) {{
+                                    const frame = buffer.slice(0, boundary);
+                                    buffer = buffer.slice(boundary + 2);
+
+                                    let eventName = "message";
+                                    let data = "";
+                                    for (const line of frame.split("\\n")) {{
+                                        if (line.startsWith("event: ")) eventName = line.slice(7);
+                                        else if (line.startsWith("data: ")) data += line.slice(6);
+                                    }}
+                                    const payload = data ? JSON.parse(data) : {{}};
+
+                                    if (eventName === "retrieval") {{
+                                        console.log("📚 Retrieved chunks:", payload.chunks);
+                                    }} else if (eventName === "token") {{
+                                        botReply += payload.text;
+                                        botMessage.innerHTML = `<br>${{formatBotReply(botReply)}}`;
+                                        chat.scrollTop = chat.scrollHeight;
+                                    }} else if (eventName === "done") {{
+                                        botReply = payload.response || botReply;
+                                        finished = true;
+                                    }} else if (eventName === "error") {{
+                                        throw new Error(payload.detail);
+                                    }}
+                                }}
+                            }}
+
+                            if (!botReply) {{
+                                botReply = "Sorry, I couldn't find anything relevant.";
+                            }}
+                            botMessage.innerHTML = `<br>${{formatBotReply(botReply)}}`;
                         }} catch (error) {{
-                            console.error("❌ Error during fetch or parse:", error);
-                            chat.innerHTML += `<div class='message bot'>Sorry, something went wrong 😢</div>`;
+                            console.error("❌ Error during streaming:", error);
+                            botMessage.innerHTML = "Sorry, something went wrong 😢";
                         }}
-    
+
                         setTimeout(() => {{
                             chat.scrollTop = chat.scrollHeight;
                         }}, 100);